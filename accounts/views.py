@@ -5,10 +5,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages  
 
 from django.core.paginator import Paginator
+from exam.conditional import conditional_page
 from exam.models import Exam, TeacherProfile
+from exam.query_metrics import query_budget
 
 # Create your views here.
 
+@conditional_page(lambda request: ['exams'])
+@query_budget(5)
 def home(request):
     exams = Exam.objects.order_by('-date', '-id')  # fallback by id if date same
     paginator = Paginator(exams, 3)  # 3 exams per page
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from exam.models import Exam,Question,StudentExamAttempt,StudentAnswer,StudentProfile,TeacherProfile
+from exam.models import Exam,Question,StudentExamAttempt,StudentAnswer,StudentProfile,TeacherProfile,QueuedSubmission
 
 # Register your models here.
 
@@ -9,3 +9,9 @@ admin.site.register(StudentExamAttempt)
 admin.site.register(StudentAnswer)
 admin.site.register(StudentProfile)
 admin.site.register(TeacherProfile)
+
+
+@admin.register(QueuedSubmission)
+class QueuedSubmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student', 'exam', 'status', 'created_at', 'processed_at')
+    list_filter = ('status',)
@@ -0,0 +1,213 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import render
+
+from .models import Exam
+
+
+OPEN = 'open'
+SUBMIT = 'submit'
+
+DEFAULT_LIMITS = {
+    # new exam opens admitted per second, and how many may arrive at once
+    'rate': 50.0,
+    'burst': 200,
+    # requests for one exam handled at the same time by this process
+    'concurrency': 64,
+    # slots only submissions may use, so opens can never starve them
+    'submit_reserve': 16,
+    # how long a submission waits for a slot before getting the waiting room
+    'submit_wait': 10.0,
+}
+
+
+def admission_settings():
+    return {**DEFAULT_LIMITS, **getattr(settings, 'EXAM_ADMISSION', {})}
+
+
+class ExamGate:
+    """
+    Admission control for one exam in this process.
+
+    Opens go through a token bucket and may only use the non-reserved part
+    of the concurrency limit. Submissions skip the bucket, may use every
+    slot and wait briefly for one instead of being turned away.
+    """
+
+    def __init__(self, **limits):
+        self.tokens = None
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.counts = {
+            # opens are admitted or turned away, they never wait
+            OPEN: {'admitted': 0, 'rejected': 0},
+            SUBMIT: {'admitted': 0, 'queued': 0, 'rejected': 0},
+        }
+        self._cond = threading.Condition()
+        self.configure(**limits)
+
+    def configure(self, rate, burst, concurrency, submit_reserve, submit_wait):
+        with self._cond:
+            self.rate = rate
+            self.burst = burst
+            self.concurrency = concurrency
+            self.submit_reserve = min(submit_reserve, concurrency - 1) if concurrency > 1 else 0
+            self.submit_wait = submit_wait
+            self.tokens = float(burst) if self.tokens is None else min(self.tokens, burst)
+            self._cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def try_open(self):
+        # Returns 0 when admitted, otherwise the suggested retry delay in seconds
+        with self._cond:
+            self._refill()
+            if self.in_flight < self.concurrency - self.submit_reserve and self.tokens >= 1:
+                self.tokens -= 1
+                self.in_flight += 1
+                self.counts[OPEN]['admitted'] += 1
+                return 0
+            self.counts[OPEN]['rejected'] += 1
+            if self.tokens < 1 and self.rate > 0:
+                return (1 - self.tokens) / self.rate
+            return 1.0
+
+    def acquire_submit(self):
+        with self._cond:
+            if self.in_flight >= self.concurrency:
+                self.counts[SUBMIT]['queued'] += 1
+                admitted = self._cond.wait_for(lambda: self.in_flight < self.concurrency, timeout=self.submit_wait)
+                if not admitted:
+                    self.counts[SUBMIT]['rejected'] += 1
+                    return False
+            self.in_flight += 1
+            self.counts[SUBMIT]['admitted'] += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_flight': self.in_flight,
+                'tokens': round(self.tokens, 1),
+                'limits': {
+                    'rate': self.rate,
+                    'burst': self.burst,
+                    'concurrency': self.concurrency,
+                    'submit_reserve': self.submit_reserve,
+                },
+                'open': dict(self.counts[OPEN]),
+                'submit': dict(self.counts[SUBMIT]),
+            }
+
+
+class AdmissionController:
+    # Per-exam gates of this process. Limits come from the exam's admission_*
+    # fields (blank = EXAM_ADMISSION defaults) and are re-read every
+    # `refresh_seconds`; counters and in-flight state are kept.
+
+    refresh_seconds = 60
+
+    def __init__(self):
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    def limits_for(self, exam_id):
+        # None when there is no such exam
+        overrides = Exam.objects.filter(id=exam_id).values(
+            'admission_rate', 'admission_burst', 'admission_concurrency'
+        ).first()
+        if overrides is None:
+            return None
+        limits = admission_settings()
+        for field, value in overrides.items():
+            if value is not None:
+                limits[field.replace('admission_', '')] = value
+        return limits
+
+    def gate(self, exam_id):
+        # The exam's gate, or None if the exam does not exist. Gates are only
+        # made for existing exams so made-up ids can't fill up _gates.
+        now = time.monotonic()
+        with self._lock:
+            gate, configured_at = self._gates.get(exam_id, (None, None))
+        if gate is not None and now - configured_at < self.refresh_seconds:
+            return gate
+
+        limits = self.limits_for(exam_id)
+        with self._lock:
+            if limits is None:
+                # deleted since, requests already holding it still release it
+                self._gates.pop(exam_id, None)
+                return None
+            gate, _ = self._gates.get(exam_id, (None, None))
+            if gate is None:
+                gate = ExamGate(**limits)
+            else:
+                gate.configure(**limits)
+            self._gates[exam_id] = (gate, now)
+        return gate
+
+    def stats(self):
+        with self._lock:
+            gates = {exam_id: gate for exam_id, (gate, _) in self._gates.items()}
+        return {exam_id: gate.stats() for exam_id, gate in gates.items()}
+
+
+admission_controller = AdmissionController()
+
+
+def admission_enabled():
+    return getattr(settings, 'EXAM_ADMISSION_ENABLED', True)
+
+
+def waiting_room(request, exam_id, retry_after):
+    # jitter spreads the retries of everyone turned away in the same second
+    retry_after = max(1, int(retry_after + random.uniform(1, 5)))
+    response = render(request, 'student/waiting_room.html', {
+        'exam_id': exam_id,
+        'retry_after': retry_after,
+        # a held-back submission is re-posted as it was
+        'post_items': list(request.POST.items()) if request.method == 'POST' else None,
+    }, status=503)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def admission_controlled(view_func):
+    """
+    Admission control for exam endpoints taking an `exam_id`. POST requests
+    count as submissions, everything else as an exam open.
+    """
+    @wraps(view_func)
+    def wrapper(request, exam_id, *args, **kwargs):
+        if not admission_enabled():
+            return view_func(request, exam_id, *args, **kwargs)
+
+        gate = admission_controller.gate(exam_id)
+        if gate is None:
+            raise Http404('No such exam')
+        if request.method == 'POST':
+            if not gate.acquire_submit():
+                return waiting_room(request, exam_id, gate.submit_wait)
+        else:
+            retry_after = gate.try_open()
+            if retry_after:
+                return waiting_room(request, exam_id, retry_after)
+        try:
+            return view_func(request, exam_id, *args, **kwargs)
+        finally:
+            gate.release()
+    return wrapper
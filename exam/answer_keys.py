@@ -0,0 +1,69 @@
+from array import array
+from collections.abc import Mapping
+
+from django.conf import settings
+
+from .lru import SizedLRU
+
+
+class AnswerKey(Mapping):
+    """
+    Compact answer key for one exam: question id -> (correct_option, marks).
+
+    Values are kept in typed arrays rather than one tuple per question so a
+    cached key for a large exam stays small.
+    """
+
+    __slots__ = ('question_ids', 'correct_options', 'marks', '_positions', 'total_marks')
+
+    def __init__(self, rows):
+        self.question_ids = array('q')
+        self.correct_options = array('b')
+        self.marks = array('l')
+        for question_id, correct_option, marks in rows:
+            self.question_ids.append(question_id)
+            self.correct_options.append(correct_option)
+            self.marks.append(marks)
+        self._positions = {qid: i for i, qid in enumerate(self.question_ids)}
+        self.total_marks = sum(self.marks)
+
+    def __getitem__(self, question_id):
+        i = self._positions[question_id]
+        return self.correct_options[i], self.marks[i]
+
+    def __iter__(self):
+        return iter(self.question_ids)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def nbytes(self):
+        # rough footprint used for the cache memory cap
+        arrays = sum(a.itemsize * len(a) for a in (self.question_ids, self.correct_options, self.marks))
+        return arrays + 100 * len(self._positions) + 200
+
+
+class AnswerKeyCache(SizedLRU):
+    """In-process LRU cache of answer keys keyed by (exam id, exam version)."""
+
+    def __init__(self, max_bytes, max_entries):
+        super().__init__(max_bytes, max_entries, sizeof=AnswerKey.nbytes)
+
+    def load(self, exam):
+        cache_key = (exam.id, exam.version)
+        key = self.get(cache_key)
+        if key is None:
+            rows = exam.questions.order_by('id').values_list('id', 'correct_option', 'marks')
+            key = AnswerKey(rows)
+            self.put(cache_key, key)
+        return key
+
+
+answer_key_cache = AnswerKeyCache(
+    max_bytes=getattr(settings, 'EXAM_ANSWER_KEY_CACHE_BYTES', 8 * 1024 * 1024),
+    max_entries=getattr(settings, 'EXAM_ANSWER_KEY_CACHE_ENTRIES', 512),
+)
+
+
+def get_answer_key(exam):
+    return answer_key_cache.load(exam)
@@ -0,0 +1,102 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import ContentVersion
+
+
+def bump_versions(*scopes):
+    now = timezone.now()
+    for scope in scopes:
+        updated = ContentVersion.objects.filter(scope=scope).update(version=F('version') + 1, updated_at=now)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                ContentVersion.objects.create(scope=scope, version=1)
+        except IntegrityError:
+            # created by someone else in the meantime
+            ContentVersion.objects.filter(scope=scope).update(version=F('version') + 1, updated_at=now)
+
+
+def _versions(request, scopes):
+    # One small query per request, shared by the ETag and Last-Modified checks
+    cached = getattr(request, '_content_versions', None)
+    if cached is None or cached[0] != scopes:
+        rows = ContentVersion.objects.filter(scope__in=scopes).values_list('scope', 'version', 'updated_at')
+        cached = (scopes, {scope: (version, updated_at) for scope, version, updated_at in rows})
+        request._content_versions = cached
+    return cached[1]
+
+
+def _has_pending_messages(request):
+    # a 304 would keep a flash message from being shown, so render instead
+    return len(get_messages(request)) > 0
+
+
+def conditional_page(scopes):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 for a page that only
+    depends on the given ContentVersion scopes and the current user.
+
+    `scopes(request, *args, **kwargs)` returns the scope names. On a 304 the
+    view itself does not run, so none of its queries or rendering happen.
+    """
+    def get_scopes(request, *args, **kwargs):
+        return tuple(scopes(request, *args, **kwargs))
+
+    def etag_func(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        scope_names = get_scopes(request, *args, **kwargs)
+        versions = _versions(request, scope_names)
+        user = request.user
+        parts = [
+            request.resolver_match.view_name if request.resolver_match else request.path,
+            str(user.pk), user.get_username(), getattr(user, 'role', ''),
+            str(getattr(user, 'last_login', '')),
+            # pages embed a CSRF token, which changes when the cookie rotates
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            request.GET.urlencode(),
+        ]
+        parts += [f"{scope}={versions.get(scope, (0, None))[0]}" for scope in scope_names]
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        versions = _versions(request, get_scopes(request, *args, **kwargs))
+        # last_login keeps another user's cached copy of the page from
+        # validating in a shared browser
+        stamps = [updated_at for _, updated_at in versions.values()]
+        stamps.append(getattr(request.user, 'last_login', None))
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        if not stamps:
+            return None
+        latest = max(stamps)
+        # HTTP dates have one-second granularity: another change later in the
+        # same second would send the same Last-Modified, so it is left out
+        # until that second is over and only the ETag validates until then
+        if latest.replace(microsecond=0) + timedelta(seconds=1) > timezone.now():
+            return None
+        return latest
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # let the browser keep the page but check back every time
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
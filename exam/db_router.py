@@ -0,0 +1,112 @@
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# set on responses to write requests, reads stay on the primary while present
+PIN_COOKIE = 'exam_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_state = threading.local()
+
+
+def analytics_db():
+    # alias teacher-facing reports read from, None keeps them on default
+    return getattr(settings, 'EXAM_ANALYTICS_DB', None)
+
+
+def primary_pin_seconds():
+    return getattr(settings, 'EXAM_PRIMARY_PIN_SECONDS', 10)
+
+
+class AnalyticsRouter:
+    """
+    Sends reads made inside an @analytics_reads view to the analytics
+    replica. Everything else, every write and every migration goes to
+    default.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'read_alias', None)
+
+    def db_for_write(self, model, **hints):
+        # explicit, otherwise objects read from the replica would be saved there
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, analytics_db()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # other aliases are replicas, copies of default that are never
+        # migrated themselves, so migrate and makemigrations' history check
+        # don't open (and create) their database files
+        return db == DEFAULT_DB_ALIAS
+
+
+def _read_from(alias, func, *args, **kwargs):
+    previous = getattr(_state, 'read_alias', None)
+    _state.read_alias = alias
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _state.read_alias = previous
+
+
+def _stream_from(alias, content):
+    # streamed responses (exports) run their queries while being sent
+    iterator = iter(content)
+    while True:
+        try:
+            chunk = _read_from(alias, next, iterator)
+        except StopIteration:
+            return
+        yield chunk
+
+
+def analytics_reads(view):
+    """
+    Read-only report views: their queries go to EXAM_ANALYTICS_DB unless the
+    user wrote something in the last EXAM_PRIMARY_PIN_SECONDS, in which case
+    they stay on the primary so the user sees their own change.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = analytics_db()
+        if not alias or PIN_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+        response = _read_from(alias, view, request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = _stream_from(alias, response.streaming_content)
+        return response
+    return wrapper
+
+
+class PrimaryPinMiddleware:
+    # Pins the browser to the primary for a while after any write request
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if analytics_db() and request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=primary_pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+
+def sync_replica(alias=None):
+    """
+    Copy the primary SQLite database into the analytics alias with SQLite's
+    online backup API. Stands in for replication when both are SQLite files.
+    """
+    alias = alias or analytics_db()
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise ValueError('sync_replica only copies between SQLite databases.')
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
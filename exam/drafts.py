@@ -0,0 +1,185 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import AnswerDraft, QueuedSubmission, StudentExamAttempt
+
+
+logger = logging.getLogger(__name__)
+
+
+def draft_flush_interval():
+    # seconds between background flushes, 0 writes every delta straight through
+    return getattr(settings, 'EXAM_DRAFT_FLUSH_INTERVAL', 2.0)
+
+
+def draft_flush_batch():
+    return getattr(settings, 'EXAM_DRAFT_FLUSH_BATCH', 200)
+
+
+def used_tokens(tokens):
+    # the submission tokens among `tokens` that already have an attempt or a
+    # queued submission; drafts saved under them belong to a finished attempt
+    tokens = {token for token in tokens if token is not None}
+    if not tokens:
+        return set()
+    used = set(StudentExamAttempt.objects.filter(submission_token__in=tokens).values_list('submission_token', flat=True))
+    used.update(QueuedSubmission.objects.filter(submission_token__in=tokens).values_list('submission_token', flat=True))
+    return used
+
+
+def write_drafts(pending):
+    """
+    Merge buffered deltas into the draft store.
+
+    `pending` maps (student_id, exam_id, submission_token) -> {question_id:
+    option}. All drafts are read with one query and written back with one
+    upsert. Deltas for a token that was submitted meanwhile are dropped, and
+    a stored draft of a submitted token is started over, so a late flush can
+    never carry answers into the next attempt.
+    """
+    if not pending:
+        return
+    student_ids = {student_id for student_id, _, _ in pending}
+    exam_ids = {exam_id for _, exam_id, _ in pending}
+
+    with transaction.atomic():
+        drafts = {
+            (draft.student_id, draft.exam_id): draft
+            for draft in AnswerDraft.objects.filter(student_id__in=student_ids, exam_id__in=exam_ids)
+        }
+        used = used_tokens([token for _, _, token in pending] + [draft.submission_token for draft in drafts.values()])
+        changed = {}
+        for (student_id, exam_id, token), deltas in pending.items():
+            if token in used:
+                continue
+            draft = drafts.get((student_id, exam_id)) or AnswerDraft(student_id=student_id, exam_id=exam_id)
+            selections = {} if draft.submission_token in used else draft.selections
+            draft.selections = {**selections, **{str(qid): option for qid, option in deltas.items()}}
+            draft.submission_token = token
+            drafts[(student_id, exam_id)] = changed[(student_id, exam_id)] = draft
+        AnswerDraft.objects.bulk_create(
+            changed.values(),
+            update_conflicts=True,
+            unique_fields=['student', 'exam'],
+            update_fields=['selections', 'submission_token', 'updated_at'],
+        )
+
+
+class DraftBuffer:
+    """
+    Per-process buffer of answer deltas.
+
+    Deltas are merged in memory and flushed in batches, either when the
+    buffer holds EXAM_DRAFT_FLUSH_BATCH drafts or every
+    EXAM_DRAFT_FLUSH_INTERVAL seconds from a background thread.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        # batches taken by a flush that has not committed yet, still readable
+        self._flushing = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, student_id, exam_id, token, deltas):
+        key = (student_id, exam_id, token)
+        if draft_flush_interval() <= 0:
+            write_drafts({key: dict(deltas)})
+            return
+        with self._lock:
+            self._pending.setdefault(key, {}).update(deltas)
+            full = len(self._pending) >= draft_flush_batch()
+        self._start_thread()
+        if full:
+            self.flush()
+
+    def drop(self, student_id, exam_id):
+        with self._lock:
+            for key in [key for key in self._pending if key[:2] == (student_id, exam_id)]:
+                del self._pending[key]
+
+    def pending_for(self, student_id, exam_id):
+        # {submission_token: {question_id: option}}, oldest first
+        by_token = {}
+        with self._lock:
+            for batch in [*self._flushing, self._pending]:
+                for (s_id, e_id, token), deltas in batch.items():
+                    if (s_id, e_id) == (student_id, exam_id):
+                        by_token.setdefault(token, {}).update(deltas)
+        return by_token
+
+    def flush(self, key=None):
+        with self._lock:
+            if key is None:
+                pending, self._pending = self._pending, {}
+            elif key in self._pending:
+                pending = {key: self._pending.pop(key)}
+            else:
+                pending = {}
+            if not pending:
+                return
+            self._flushing.append(pending)
+        try:
+            write_drafts(pending)
+        except Exception:
+            # put the deltas back (without overwriting newer ones) for the next flush
+            with self._lock:
+                for k, deltas in pending.items():
+                    self._pending[k] = {**deltas, **self._pending.get(k, {})}
+            raise
+        finally:
+            with self._lock:
+                self._flushing = [batch for batch in self._flushing if batch is not pending]
+
+    def _start_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='answer-draft-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(draft_flush_interval())
+            try:
+                self.flush()
+            except Exception:
+                # the deltas are back in the buffer for the next round
+                logger.exception('Flushing answer drafts failed')
+            finally:
+                connections.close_all()
+
+
+draft_buffer = DraftBuffer()
+atexit.register(draft_buffer.flush)
+
+
+def save_draft(student, exam, token, deltas):
+    draft_buffer.add(student.id, exam.id, token, deltas)
+
+
+def load_draft(student, exam):
+    """
+    {question_id: option} from the draft store plus this process's buffer,
+    leaving out anything saved under a token that was already submitted.
+    """
+    stored = AnswerDraft.objects.filter(student=student, exam=exam).values_list('submission_token', 'selections').first()
+    drafts = [(stored[0], {int(qid): option for qid, option in stored[1].items()})] if stored else []
+    drafts += draft_buffer.pending_for(student.id, exam.id).items()
+    used = used_tokens(token for token, _ in drafts)
+    selections = {}
+    for token, deltas in drafts:
+        if token not in used:
+            selections.update(deltas)
+    return selections
+
+
+def discard_draft(student, exam):
+    draft_buffer.drop(student.id, exam.id)
+    AnswerDraft.objects.filter(student=student, exam=exam).delete()
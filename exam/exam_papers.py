@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .lru import SizedLRU
+
+
+def _html_size(html):
+    return len(html.encode('utf-8'))
+
+
+# Rendered question list of attempt_exam, identical for every student. The
+# per-request parts (CSRF and submission tokens, timer, saved answers) stay
+# in attempt_exam.html around it.
+paper_cache = SizedLRU(
+    max_bytes=getattr(settings, 'EXAM_PAPER_CACHE_BYTES', 16 * 1024 * 1024),
+    max_entries=getattr(settings, 'EXAM_PAPER_CACHE_ENTRIES', 256),
+    sizeof=_html_size,
+)
+
+
+def section_size():
+    return getattr(settings, 'EXAM_SECTION_SIZE', 25)
+
+
+def section_count(answer_key):
+    # 0 means the exam is small enough to be sent as one page
+    if len(answer_key) <= section_size():
+        return 0
+    return (len(answer_key) + section_size() - 1) // section_size()
+
+
+def get_exam_paper(exam, answer_key, section=None):
+    """
+    Rendered questions of an exam, or of one 1-based section of it when the
+    exam is delivered in sections.
+    """
+    cache_key = (exam.id, exam.version, section)
+    html = paper_cache.get(cache_key)
+    if html is None:
+        questions = exam.questions.order_by('id')
+        start = 0
+        if section is not None:
+            start = (section - 1) * section_size()
+            question_ids = list(answer_key)[start:start + section_size()]
+            questions = questions.filter(id__in=question_ids)
+        html = mark_safe(render_to_string('exam/exam_paper.html', {
+            'questions': questions,
+            'start': start,
+            'sectioned': section is not None,
+        }))
+        paper_cache.put(cache_key, html)
+    return html
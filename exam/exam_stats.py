@@ -0,0 +1,205 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Exam, ExamStats, Question, ScoreBucket, StudentExamAttempt, StudentExamBest, StudentStats
+from .ranking import bucket_for, rank_cache
+
+
+def rebuild_exam_stats(exam_ids=None, chunk_size=500):
+    """
+    Recompute ExamStats and the score buckets from scratch for the given
+    exams (all by default).
+
+    Questions and attempts are aggregated in two separate grouped queries,
+    never joined, so the cost is linear in the number of rows. Returns the
+    number of exams rebuilt.
+    """
+    exams = Exam.objects.order_by('id')
+    if exam_ids is not None:
+        exams = exams.filter(id__in=exam_ids)
+    ids = list(exams.values_list('id', flat=True))
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        questions = {
+            row['exam_id']: row
+            for row in Question.objects.filter(exam_id__in=chunk).values('exam_id')
+            .annotate(count=Count('id'), marks=Sum('marks'))
+        }
+        attempts = {
+            row['exam_id']: row
+            for row in StudentExamAttempt.objects.filter(exam_id__in=chunk).values('exam_id')
+            .annotate(count=Count('id'), score_sum=Sum('score'))
+        }
+        buckets = {}
+        score_counts = (
+            StudentExamAttempt.objects.filter(exam_id__in=chunk).values('exam_id', 'score')
+            .annotate(count=Count('id')).values_list('exam_id', 'score', 'count')
+        )
+        for exam_id, score, count in score_counts:
+            key = (exam_id, bucket_for(score))
+            buckets[key] = buckets.get(key, 0) + count
+
+        with transaction.atomic():
+            ScoreBucket.objects.filter(exam_id__in=chunk).delete()
+            ScoreBucket.objects.bulk_create(
+                ScoreBucket(exam_id=exam_id, bucket=bucket, count=count)
+                for (exam_id, bucket), count in buckets.items()
+            )
+        for exam_id in chunk:
+            rank_cache.invalidate(exam_id)
+
+        ExamStats.objects.bulk_create(
+            [
+                ExamStats(
+                    exam_id=exam_id,
+                    question_count=questions.get(exam_id, {}).get('count') or 0,
+                    total_marks=questions.get(exam_id, {}).get('marks') or 0,
+                    submission_count=attempts.get(exam_id, {}).get('count') or 0,
+                    score_sum=attempts.get(exam_id, {}).get('score_sum') or 0.0,
+                )
+                for exam_id in chunk
+            ],
+            update_conflicts=True,
+            unique_fields=['exam'],
+            update_fields=['question_count', 'total_marks', 'submission_count', 'score_sum'],
+        )
+        ExamStats.objects.filter(exam_id__in=chunk).update(version=F('version') + 1)
+    return len(ids)
+
+
+def rebuild_student_stats(student_ids=None, chunk_size=500):
+    """
+    Recompute StudentStats and StudentExamBest from scratch for the given
+    students (by default everyone who is a student or has attempts).
+    Returns the number of students rebuilt.
+    """
+    users = get_user_model().objects.order_by('id')
+    if student_ids is not None:
+        users = users.filter(id__in=list(student_ids))
+    else:
+        users = users.filter(Q(role='student') | Q(exam_attempts__isnull=False)).distinct()
+    ids = list(users.values_list('id', flat=True))
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        stats = {student_id: StudentStats(student_id=student_id) for student_id in chunk}
+        bests = {}
+        rows = (
+            StudentExamAttempt.objects.filter(student_id__in=chunk)
+            .order_by('student_id', 'submitted_at', 'id')
+            .values_list('student_id', 'exam_id', 'score', 'submitted_at')
+        )
+        for student_id, exam_id, score, submitted_at in rows:
+            row = stats[student_id]
+            row.attempt_count += 1
+            row.score_sum += score
+            row.best_score = score if row.best_score is None else max(row.best_score, score)
+            row.latest_score = score
+            row.latest_submitted_at = submitted_at
+
+            best = bests.get((student_id, exam_id))
+            if best is None:
+                best = bests[(student_id, exam_id)] = StudentExamBest(student_id=student_id, exam_id=exam_id, best_score=score)
+            best.best_score = max(best.best_score, score)
+            best.attempt_count += 1
+
+        with transaction.atomic():
+            StudentStats.objects.bulk_create(
+                list(stats.values()),
+                update_conflicts=True,
+                unique_fields=['student'],
+                update_fields=['attempt_count', 'score_sum', 'best_score', 'latest_score', 'latest_submitted_at'],
+            )
+            StudentExamBest.objects.filter(student_id__in=chunk).delete()
+            StudentExamBest.objects.bulk_create(bests.values())
+    return len(ids)
+
+
+_pending_students = threading.local()
+
+
+def _rebuild_pending_students():
+    ids = getattr(_pending_students, 'ids', None)
+    _pending_students.ids = set()
+    if ids:
+        rebuild_student_stats(ids)
+
+
+def schedule_student_rebuild(student_id):
+    # Deletes can be part of a user or exam cascade, where rebuilding right
+    # away would recreate rows that are about to go. Rebuild once the
+    # transaction has committed instead, once per student.
+    if getattr(_pending_students, 'ids', None) is None:
+        _pending_students.ids = set()
+    _pending_students.ids.add(student_id)
+    transaction.on_commit(_rebuild_pending_students)
+
+
+def _add_to_score_bucket(exam_id, score):
+    bucket = ScoreBucket.objects.filter(exam_id=exam_id, bucket=bucket_for(score))
+    if bucket.update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ScoreBucket.objects.create(exam_id=exam_id, bucket=bucket_for(score), count=1)
+    except IntegrityError:
+        # created by someone else in the meantime
+        bucket.update(count=F('count') + 1)
+
+
+def record_attempt_added(attempt):
+    updated = ExamStats.objects.filter(exam_id=attempt.exam_id).update(
+        submission_count=F('submission_count') + 1,
+        score_sum=F('score_sum') + attempt.score,
+        version=F('version') + 1,
+    )
+    if not updated:
+        # also rebuilds the score buckets, including this attempt
+        rebuild_exam_stats([attempt.exam_id])
+    else:
+        _add_to_score_bucket(attempt.exam_id, attempt.score)
+
+    score = Value(attempt.score)
+    updated = StudentStats.objects.filter(student_id=attempt.student_id).update(
+        attempt_count=F('attempt_count') + 1,
+        score_sum=F('score_sum') + attempt.score,
+        best_score=Greatest(Coalesce(F('best_score'), score), score),
+        latest_score=attempt.score,
+        latest_submitted_at=attempt.submitted_at,
+    )
+    updated_best = StudentExamBest.objects.filter(student_id=attempt.student_id, exam_id=attempt.exam_id).update(
+        best_score=Greatest(F('best_score'), score),
+        attempt_count=F('attempt_count') + 1,
+    )
+    # first attempt of this student (or at this exam)
+    if not updated or not updated_best:
+        rebuild_student_stats([attempt.student_id])
+
+
+def record_attempt_removed(attempt):
+    # no rebuild fallback here: during an exam delete the stats row may
+    # already be gone and must not be recreated
+    ExamStats.objects.filter(exam_id=attempt.exam_id).update(
+        submission_count=Greatest(F('submission_count') - 1, 0),
+        score_sum=F('score_sum') - attempt.score,
+        version=F('version') + 1,
+    )
+    ScoreBucket.objects.filter(exam_id=attempt.exam_id, bucket=bucket_for(attempt.score)).update(
+        count=Greatest(F('count') - 1, 0),
+    )
+    schedule_student_rebuild(attempt.student_id)
+
+
+def refresh_question_stats(exam_id):
+    # question edits are rare and may change marks, so recount that exam's questions
+    row = Question.objects.filter(exam_id=exam_id).aggregate(count=Count('id'), marks=Sum('marks'))
+    ExamStats.objects.filter(exam_id=exam_id).update(
+        question_count=row['count'] or 0,
+        total_marks=row['marks'] or 0,
+        version=F('version') + 1,
+    )
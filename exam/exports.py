@@ -0,0 +1,112 @@
+import csv
+import tempfile
+
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import AnswerLayout, StudentAnswer, StudentExamAttempt
+from .packed_answers import unpack_selections
+
+
+EXPORT_CHUNK_SIZE = 2000
+STREAM_BLOCK_SIZE = 64 * 1024
+
+ATTEMPT_COLUMNS = [
+    'attempt_id', 'student', 'submitted_at', 'score', 'marks_earned', 'total_marks', 'correct_count', 'answered_count',
+]
+
+
+def _attempts(exam, *fields):
+    return (
+        StudentExamAttempt.objects.filter(exam=exam).order_by('id')
+        .values_list('id', 'student_username', 'submitted_at', 'score', *fields)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def attempt_rows(exam):
+    # Header, then one row per attempt
+    yield ATTEMPT_COLUMNS
+    yield from _attempts(exam, 'marks_earned', 'total_marks', 'correct_count', 'answered_count')
+
+
+def answer_matrix_rows(exam):
+    """
+    Header, the answer key, then one row per attempt with the selected
+    option (1-4, blank if unanswered) of every question.
+
+    Attempts and row-stored answers are read as two id-ordered streams and
+    merged, so only one attempt's answers are held at a time.
+    """
+    questions = list(exam.questions.order_by('id').values_list('id', 'correct_option'))
+    column = {question_id: i for i, (question_id, _) in enumerate(questions)}
+    yield ['attempt_id', 'student', 'submitted_at', 'score'] + [f'Q{i} (#{qid})' for i, (qid, _) in enumerate(questions, 1)]
+    yield ['', 'answer key', '', ''] + [correct for _, correct in questions]
+
+    answers = (
+        StudentAnswer.objects.filter(attempt__exam=exam).order_by('attempt_id')
+        .values_list('attempt_id', 'question_id', 'selected_option')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    pending = next(answers, None)
+    layouts = {}
+
+    for attempt_id, student, submitted_at, score, layout_id, packed in _attempts(exam, 'answer_layout_id', 'packed_answers'):
+        if layout_id is not None:
+            if layout_id not in layouts:
+                layouts[layout_id] = AnswerLayout.objects.values_list('question_ids', flat=True).get(id=layout_id)
+            selections = unpack_selections(layouts[layout_id], packed)
+        else:
+            selections = {}
+            while pending is not None and pending[0] < attempt_id:
+                pending = next(answers, None)
+            while pending is not None and pending[0] == attempt_id:
+                selections[pending[1]] = pending[2]
+                pending = next(answers, None)
+
+        cells = [''] * len(questions)
+        for question_id, option in selections.items():
+            if question_id in column:
+                cells[column[question_id]] = option
+        yield [attempt_id, student, submitted_at, score] + cells
+
+
+class _Echo:
+    # csv.writer target that hands each formatted line back instead of storing it
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+
+
+def _excel_value(value):
+    # Excel has no time zones, so datetimes are written in local time
+    if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def stream_xlsx(rows, title):
+    """
+    Write the rows with openpyxl's write-only mode, which spools them to a
+    temporary file instead of keeping cells in memory, then stream the
+    finished workbook. An .xlsx is a zip whose index comes last, so nothing
+    can be sent before the last row is written.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    for row in rows:
+        sheet.append([_excel_value(value) for value in row])
+
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            block = f.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
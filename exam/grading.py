@@ -0,0 +1,142 @@
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+
+from .answer_keys import get_answer_key
+from .models import AnswerLayout, StudentAnswer, StudentExamAttempt
+from .packed_answers import pack_selections
+from .write_lane import write_lane, write_lane_enabled
+
+
+VALID_OPTIONS = {1, 2, 3, 4}
+SUBMISSION_TOKEN_SALT = 'exam.submission_token'
+
+# (exam id, exam version) -> AnswerLayout, layouts never change once written
+_layouts = {}
+
+
+def packed_answers_enabled():
+    return getattr(settings, 'EXAM_PACKED_ANSWERS', False)
+
+
+def get_answer_layout(exam, answer_key):
+    cache_key = (exam.id, exam.version)
+    layout = _layouts.get(cache_key)
+    if layout is None:
+        layout, _ = AnswerLayout.objects.get_or_create(
+            exam=exam,
+            version=exam.version,
+            defaults={'question_ids': list(answer_key)},
+        )
+        if len(_layouts) > 1024:
+            _layouts.clear()
+        _layouts[cache_key] = layout
+    return layout
+
+
+def issue_submission_token(student, exam):
+    # Signed so any app process can check it without shared state; the uuid
+    # inside is what gets stored (uniquely) on the attempt.
+    return signing.dumps(
+        {'student': student.id, 'exam': exam.id, 'token': uuid.uuid4().hex},
+        salt=SUBMISSION_TOKEN_SALT,
+    )
+
+
+def read_submission_token(value, student, exam):
+    # Returns the token uuid, or None if the value is missing, tampered with
+    # or was issued to another student or exam.
+    if not value:
+        return None
+    try:
+        data = signing.loads(value, salt=SUBMISSION_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get('student') != student.id or data.get('exam') != exam.id:
+        return None
+    return uuid.UUID(data['token'])
+
+
+def parse_selections(data, answer_key):
+    # Pull the chosen option for every question in the key out of the POST data.
+    # Missing, non numeric or out of range values are treated as unanswered.
+    selections = {}
+    for question_id in answer_key:
+        raw = data.get(str(question_id))
+        if not raw:
+            continue
+        try:
+            option = int(raw)
+        except (TypeError, ValueError):
+            continue
+        if option in VALID_OPTIONS:
+            selections[question_id] = option
+    return selections
+
+
+def score_selections(answer_key, selections):
+    # Returns (correct_count, marks_earned, score as percentage of questions)
+    total_questions = len(answer_key)
+    total_correct = 0
+    marks_earned = 0
+    for qid, option in selections.items():
+        if qid not in answer_key:
+            continue
+        correct_option, marks = answer_key[qid]
+        if option == correct_option:
+            total_correct += 1
+            marks_earned += marks
+    score = (total_correct / total_questions) * 100 if total_questions > 0 else 0
+    return total_correct, marks_earned, score
+
+
+def grade_submission(student, exam, data, submission_token=None):
+    """
+    Grade a submitted exam and store the attempt with all its answers.
+
+    The answer key comes from the in-process answer key cache, the answer
+    rows are built in memory and written with a single bulk insert, so the
+    number of queries does not depend on how many questions the exam has.
+    With EXAM_WRITE_LANE on, grading still happens in the request but the
+    write goes through the process's single-writer lane.
+    """
+    answer_key = get_answer_key(exam)
+    selections = parse_selections(data, answer_key)
+    if write_lane_enabled():
+        return write_lane.run(save_graded_attempt, student, exam, answer_key, selections, submission_token)
+    return save_graded_attempt(student, exam, answer_key, selections, submission_token)
+
+
+def save_graded_attempt(student, exam, answer_key, selections, submission_token=None):
+    total_correct, marks_earned, score = score_selections(answer_key, selections)
+    attempt = StudentExamAttempt(
+        student=student,
+        exam=exam,
+        score=score,
+        marks_earned=marks_earned,
+        total_marks=answer_key.total_marks,
+        correct_count=total_correct,
+        answered_count=len(selections),
+        submission_token=submission_token,
+    )
+
+    if packed_answers_enabled():
+        # one row, no StudentAnswer inserts at all
+        layout = get_answer_layout(exam, answer_key)
+        attempt.answer_layout = layout
+        attempt.packed_answers = pack_selections(layout.question_ids, selections)
+        # atomic so the exam's dashboard counters move with the attempt
+        with transaction.atomic():
+            attempt.save()
+        return attempt
+
+    with transaction.atomic():
+        attempt.save()
+        StudentAnswer.objects.bulk_create([
+            StudentAnswer(attempt=attempt, question_id=qid, selected_option=option)
+            for qid, option in selections.items()
+        ])
+
+    return attempt
@@ -0,0 +1,166 @@
+import numpy as np
+from django.db import transaction
+
+from .answer_keys import get_answer_key
+from .models import ItemAnalysis, ItemStatistic, StudentExamAttempt
+from .regrade import load_answers
+
+
+OPTION_FIELDS = ['option1_count', 'option2_count', 'option3_count', 'option4_count']
+SUM_FIELDS = ['correct_count', 'sum_totals_correct', *OPTION_FIELDS]
+
+
+def _item_sums(answer_key, answers, attempt_ids):
+    """
+    Per-question sums over a set of attempts, in answer key order: correct
+    count, sum of attempt totals among those who got it right and the
+    count of each option. Also returns each attempt's total.
+    """
+    key_ids = np.asarray(answer_key.question_ids, dtype=np.int64)
+    order = np.argsort(key_ids)
+    sorted_ids = key_ids[order]
+    key_correct = np.asarray(answer_key.correct_options, dtype=np.int64)[order]
+    k, n = len(key_ids), len(attempt_ids)
+
+    # drop answers to questions that are no longer in the key
+    pos = np.minimum(np.searchsorted(sorted_ids, answers[:, 1]), max(k - 1, 0))
+    in_key = (sorted_ids[pos] == answers[:, 1]) if k else np.zeros(len(answers), dtype=bool)
+    answers, pos = answers[in_key], pos[in_key]
+    item = order[pos]
+    attempt_idx = np.searchsorted(attempt_ids, answers[:, 0])
+    options = answers[:, 2]
+    is_correct = options == key_correct[pos]
+
+    totals = np.bincount(attempt_idx, weights=is_correct, minlength=n).astype(np.int64)
+    sums = np.zeros((k, len(SUM_FIELDS)), dtype=np.int64)
+    sums[:, 0] = np.bincount(item, weights=is_correct, minlength=k)
+    sums[:, 1] = np.bincount(item, weights=np.where(is_correct, totals[attempt_idx], 0), minlength=k)
+    valid = (options >= 1) & (options <= 4)
+    option_counts = np.bincount(item[valid] * 4 + options[valid] - 1, minlength=k * 4)
+    sums[:, 2:] = option_counts.reshape(k, 4)
+    return sums, totals
+
+
+def _derived(n, sum_totals, sum_totals_sq, correct, sum_totals_correct):
+    """
+    p-values, corrected point-biserial discriminations (item against the
+    total of the other items) and KR-20 from the running sums.
+    """
+    k = len(correct)
+    if n == 0 or k == 0:
+        return [None] * k, [None] * k, None
+    p = correct / n
+
+    # T' = T - x per item; x is 0/1 so x^2 == x
+    sum_rest = sum_totals - correct
+    sum_rest_sq = sum_totals_sq - 2 * sum_totals_correct + correct
+    mean_rest = sum_rest / n
+    var_rest = sum_rest_sq / n - mean_rest ** 2
+    cov = (sum_totals_correct - correct) / n - p * mean_rest
+    denom = np.sqrt(np.clip(p * (1 - p), 0, None) * np.clip(var_rest, 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discrimination = np.where(denom > 1e-12, cov / denom, np.nan)
+
+    var_totals = sum_totals_sq / n - (sum_totals / n) ** 2
+    kr20 = None
+    if k > 1 and var_totals > 1e-12:
+        kr20 = float(k / (k - 1) * (1 - (p * (1 - p)).sum() / var_totals))
+
+    p_values = [float(v) for v in p]
+    discriminations = [None if np.isnan(v) else float(v) for v in discrimination]
+    return p_values, discriminations, kr20
+
+
+def refresh_item_analysis(exam, chunk_size=5000):
+    """
+    Bring the exam's materialized item analysis up to date and return it.
+
+    Only attempts newer than the last refresh are read. A changed answer key
+    (new exam version) or a deleted attempt invalidates the running sums,
+    in which case everything is recomputed.
+    """
+    answer_key = get_answer_key(exam)
+    question_ids = list(answer_key.question_ids)
+
+    with transaction.atomic():
+        analysis, _ = ItemAnalysis.objects.select_for_update().get_or_create(exam=exam)
+        attempts = StudentExamAttempt.objects.filter(exam=exam)
+        rebuild = (
+            analysis.exam_version != exam.version
+            or attempts.filter(id__lte=analysis.last_attempt_id).count() != analysis.attempt_count
+        )
+        after_id = 0 if rebuild else analysis.last_attempt_id
+        attempt_ids = np.fromiter(
+            attempts.filter(id__gt=after_id).order_by('id').values_list('id', flat=True), dtype=np.int64
+        )
+        if not rebuild and not len(attempt_ids):
+            return analysis
+
+        sums, totals = _item_sums(answer_key, load_answers(exam, chunk_size, after_id), attempt_ids)
+        if rebuild:
+            analysis.attempt_count = analysis.sum_totals = analysis.sum_totals_sq = 0
+            existing = {}
+        else:
+            existing = {
+                row[0]: row[1:]
+                for row in ItemStatistic.objects.filter(analysis=analysis).values_list('question_id', *SUM_FIELDS)
+            }
+        for i, question_id in enumerate(question_ids):
+            if question_id in existing:
+                sums[i] += np.asarray(existing[question_id], dtype=np.int64)
+
+        analysis.exam_version = exam.version
+        analysis.attempt_count += len(attempt_ids)
+        analysis.sum_totals += int(totals.sum())
+        analysis.sum_totals_sq += int((totals ** 2).sum())
+        if len(attempt_ids):
+            analysis.last_attempt_id = int(attempt_ids[-1])
+        elif rebuild:
+            analysis.last_attempt_id = 0
+
+        p_values, discriminations, analysis.kr20 = _derived(
+            analysis.attempt_count, analysis.sum_totals, analysis.sum_totals_sq,
+            sums[:, 0].astype(np.float64), sums[:, 1].astype(np.float64),
+        )
+        analysis.save()
+
+        items = [
+            ItemStatistic(
+                analysis=analysis, question_id=question_id,
+                p_value=p_values[i], discrimination=discriminations[i],
+                **{field: int(value) for field, value in zip(SUM_FIELDS, sums[i])},
+            )
+            for i, question_id in enumerate(question_ids)
+        ]
+        ItemStatistic.objects.filter(analysis=analysis).exclude(question_id__in=question_ids).delete()
+        ItemStatistic.objects.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=['analysis', 'question'],
+            update_fields=[*SUM_FIELDS, 'p_value', 'discrimination'],
+        )
+    return analysis
+
+
+def item_report(analysis):
+    # Rows for the report page, in question order
+    n = analysis.attempt_count
+    rows = []
+    for item in analysis.items.select_related('question').order_by('question_id'):
+        counts = [getattr(item, field) for field in OPTION_FIELDS]
+        rows.append({
+            'question': item.question,
+            'p_value': item.p_value,
+            'discrimination': item.discrimination,
+            'options': [
+                {'number': number, 'rate': count / n if n else None, 'correct': number == item.question.correct_option}
+                for number, count in enumerate(counts, start=1)
+            ],
+            'omitted': (n - sum(counts)) / n if n else None,
+            # the usual review flags: too hard / too easy, or weak discrimination
+            'flagged': item.p_value is not None and (
+                item.p_value < 0.2 or item.p_value > 0.9
+                or (item.discrimination is not None and item.discrimination < 0.2)
+            ),
+        })
+    return rows
@@ -0,0 +1,86 @@
+import random
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from exam.answer_keys import get_answer_key
+from exam.grading import save_graded_attempt
+from exam.models import Exam, Question
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare write time and storage of row-per-answer and packed answer storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--attempts', type=int, default=500)
+
+    def handle(self, *args, **options):
+        results = [self.run_mode(packed, options['questions'], options['attempts']) for packed in (False, True)]
+
+        self.stdout.write(f"{options['attempts']} attempts x {options['questions']} questions")
+        for label, (seconds, nbytes) in zip(('rows', 'packed'), results):
+            size = f'{nbytes / 1024:.0f} KiB' if nbytes is not None else 'n/a'
+            self.stdout.write(
+                f'{label:>7}: {seconds:.2f}s ({options["attempts"] / seconds:.0f} attempts/s), storage {size}'
+            )
+        (row_time, row_bytes), (packed_time, packed_bytes) = results
+        self.stdout.write(f'write speedup x{row_time / packed_time:.1f}')
+        if row_bytes and packed_bytes:
+            self.stdout.write(f'storage saving x{row_bytes / packed_bytes:.1f}')
+
+    def run_mode(self, packed, question_count, attempt_count):
+        # everything is written inside a transaction that is rolled back
+        result = None
+        try:
+            with transaction.atomic(), override_settings(EXAM_PACKED_ANSWERS=packed):
+                student = get_user_model().objects.create(username=f'benchmark-{time.time_ns()}', role='student')
+                exam = Exam.objects.create(title='Benchmark', description='', date=date.today(), total_marks=question_count)
+                Question.objects.bulk_create([
+                    Question(
+                        exam=exam, question_text=f'Q{i}', option1='a', option2='b', option3='c', option4='d',
+                        correct_option=random.randint(1, 4),
+                    )
+                    for i in range(question_count)
+                ])
+                answer_key = get_answer_key(exam)
+                submissions = [
+                    {qid: random.randint(1, 4) for qid in answer_key if random.random() < 0.95}
+                    for _ in range(attempt_count)
+                ]
+
+                pages_before = self.sqlite_pages()
+                start = time.perf_counter()
+                for selections in submissions:
+                    save_graded_attempt(student, exam, answer_key, selections)
+                seconds = time.perf_counter() - start
+                pages_after = self.sqlite_pages()
+
+                nbytes = None
+                if pages_before is not None:
+                    nbytes = (pages_after - pages_before) * self.sqlite_page_size()
+                result = (seconds, nbytes)
+                raise Rollback
+        except Rollback:
+            pass
+        return result
+
+    def sqlite_pages(self):
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA page_count')
+            return cursor.fetchone()[0]
+
+    def sqlite_page_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA page_size')
+            return cursor.fetchone()[0]
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+import uuid
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from exam.answer_keys import get_answer_key
+from exam.grading import grade_submission
+from exam.models import Exam, Question
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test concurrent exam submissions against the SQLite database with the stock '
+        'configuration, the tuned one from settings, and the tuned one plus the write lane.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--submissions', type=int, default=800)
+        parser.add_argument('--questions', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark is for the SQLite backend.')
+        db_settings = connections.settings[DEFAULT_DB_ALIAS]
+        tuned = db_settings['OPTIONS']
+        modes = [
+            ('stock', {}, 'DELETE', False),
+            ('tuned', tuned, 'WAL', False),
+            ('tuned + lane', tuned, 'WAL', True),
+        ]
+
+        exam, students = self.setup(options['threads'], options['questions'])
+        try:
+            self.stdout.write(
+                f"{options['submissions']} submissions x {options['questions']} questions, {options['threads']} threads"
+            )
+            for label, db_options, journal_mode, lane in modes:
+                db_settings['OPTIONS'] = db_options
+                self.set_journal_mode(journal_mode)
+                with override_settings(EXAM_WRITE_LANE=lane):
+                    ok, failed, seconds = self.run_mode(exam, students, options['submissions'])
+                self.stdout.write(
+                    f'{label:>13}: {ok / seconds:7.1f} submissions/s, {failed} failed, {seconds:.2f}s'
+                )
+        finally:
+            db_settings['OPTIONS'] = tuned
+            connections.close_all()
+            exam.delete()
+            get_user_model().objects.filter(id__in=[student.id for student in students]).delete()
+            self.set_journal_mode('WAL')
+
+    def setup(self, thread_count, question_count):
+        stamp = time.time_ns()
+        students = [
+            get_user_model().objects.create(username=f'benchmark-{stamp}-{i}', role='student')
+            for i in range(thread_count)
+        ]
+        exam = Exam.objects.create(title='Benchmark', description='', date=date.today(), total_marks=question_count)
+        Question.objects.bulk_create([
+            Question(
+                exam=exam, question_text=f'Q{i}', option1='a', option2='b', option3='c', option4='d',
+                correct_option=random.randint(1, 4),
+            )
+            for i in range(question_count)
+        ])
+        return exam, students
+
+    def set_journal_mode(self, mode):
+        # the journal mode is stored in the database file, so switch it with
+        # no other connection open
+        connections.close_all()
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+        connections.close_all()
+
+    def run_mode(self, exam, students, submission_count):
+        answer_key = get_answer_key(exam)
+        remaining = iter(range(submission_count))
+        lock = threading.Lock()
+        counts = {'ok': 0, 'failed': 0}
+
+        def worker(student):
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    data = {str(qid): str(random.randint(1, 4)) for qid in answer_key if random.random() < 0.95}
+                    try:
+                        grade_submission(student, exam, data, uuid.uuid4())
+                        result = 'ok'
+                    except OperationalError:
+                        # "database is locked"
+                        result = 'failed'
+                    with lock:
+                        counts[result] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(student,)) for student in students]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts['ok'], counts['failed'], time.perf_counter() - start
@@ -0,0 +1,41 @@
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from exam.static_assets import IMAGE_EXTENSIONS, SOURCE_ONLY_PATTERNS, brotli, optimize_image, register_heif_opener
+
+
+class Command(BaseCommand):
+    help = "Convert / resize static images to .webp, then collect hashed and precompressed static files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-width', type=int, default=1600, help='Widest image width in pixels.')
+        parser.add_argument('--quality', type=int, default=80, help='WebP quality (0-100).')
+        parser.add_argument('--skip-images', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_images']:
+            self.optimize_images(options['max_width'], options['quality'])
+        if brotli is None:
+            self.stdout.write('brotli is not installed, writing gzip variants only.')
+        call_command(
+            'collectstatic', interactive=False, verbosity=options['verbosity'],
+            ignore_patterns=SOURCE_ONLY_PATTERNS,
+        )
+
+    def optimize_images(self, max_width, quality):
+        for static_dir in settings.STATICFILES_DIRS:
+            for dirpath, _, filenames in os.walk(static_dir):
+                for filename in sorted(filenames):
+                    ext = os.path.splitext(filename)[1].lower()
+                    if ext not in IMAGE_EXTENSIONS:
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    out = optimize_image(path, max_width=max_width, quality=quality)
+                    if out is not None:
+                        before, after = os.path.getsize(path), os.path.getsize(out)
+                        self.stdout.write(f"{path}: {before // 1024} KiB -> {os.path.basename(out)} {after // 1024} KiB")
+                    elif ext in ('.heic', '.heif') and register_heif_opener is None:
+                        self.stdout.write(f"{path}: skipped, install pillow-heif to convert HEIC images")
@@ -0,0 +1,104 @@
+import logging
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from exam.submission_queue import (
+    claim_batch, new_worker_id, process_batch, queue_stats, requeue_stale,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(batch_size, poll_interval, once, stale_after):
+    import django
+    django.setup()
+
+    worker_id = new_worker_id()
+    requeued_at = time.monotonic()
+    while True:
+        # items of a worker that died are put back while the others keep running
+        if time.monotonic() - requeued_at >= stale_after:
+            requeued_at = time.monotonic()
+            try:
+                requeue_stale(stale_after)
+            except OperationalError:
+                pass
+        # claim_batch also returns rows this worker claimed but could not
+        # finish, so a batch that hit a locked database is retried here
+        try:
+            items = claim_batch(worker_id, batch_size)
+            if items:
+                process_batch(items)
+                continue
+        except OperationalError:
+            time.sleep(poll_interval)
+            continue
+        except Exception:
+            # keep the worker alive, its claimed rows are retried next round
+            logger.exception('Grading worker %s failed a batch', worker_id)
+            connections.close_all()
+            time.sleep(poll_interval)
+            continue
+        if once:
+            break
+        time.sleep(poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Grade queued exam submissions with a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--poll-interval', type=float, default=0.5)
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Requeue items claimed longer than this many seconds ago.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling forever.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print queue depth and throughput and exit.')
+        parser.add_argument('--stats-interval', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        requeued = requeue_stale(options['stale_after'])
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale submission(s).')
+
+        # workers must not share the parent's database connection
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=run_worker,
+                args=(options['batch_size'], options['poll_interval'], options['once'], options['stale_after']),
+            )
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {len(workers)} grading worker(s).')
+
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=options['stats_interval'] / len(workers))
+                self.print_stats()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+
+    def print_stats(self):
+        stats = queue_stats()
+        self.stdout.write(
+            'pending={pending} processing={processing} failed={failed} '
+            'graded/s={graded_per_second:.1f}'.format(**stats)
+        )
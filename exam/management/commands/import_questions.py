@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exam.models import Exam
+from exam.question_import import IMPORT_BATCH_SIZE, ImportFileError, import_questions, read_question_rows
+
+
+class Command(BaseCommand):
+    help = "Import questions into an exam from a .csv or .xlsx file in the QuestionForm column layout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without importing anything.')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist.")
+
+        start = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as f:
+                report = import_questions(
+                    exam, read_question_rows(f, options['path']),
+                    dry_run=options['dry_run'], batch_size=options['batch_size'],
+                )
+        except (ImportFileError, OSError) as e:
+            raise CommandError(str(e))
+        seconds = time.perf_counter() - start
+
+        if report['invalid']:
+            summary = f"{report['invalid']} invalid rows, nothing imported"
+        elif options['dry_run']:
+            summary = f"would import {report['valid']} questions"
+        else:
+            summary = f"imported {report['imported']} questions"
+        self.stdout.write(f"{exam.title}: {summary} ({seconds:.2f}s).")
+        for row in report['errors']:
+            problems = '; '.join(f"{field}: {' '.join(errors)}" for field, errors in row['errors'].items())
+            self.stdout.write(f"  line {row['line']}: {problems}")
+        if report['invalid'] > len(report['errors']):
+            self.stdout.write(f"  ... {report['invalid'] - len(report['errors'])} more invalid rows not listed")
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exam.exam_stats import rebuild_exam_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the teacher dashboard counters (ExamStats) and score buckets from scratch, for all exams or the given ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_exam_stats(options['exam_ids'] or None, chunk_size=options['chunk_size'])
+        self.stdout.write(f"Rebuilt counters for {count} exams in {time.perf_counter() - start:.2f}s.")
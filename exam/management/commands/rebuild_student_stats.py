@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exam.exam_stats import rebuild_student_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-student rollups (StudentStats, StudentExamBest) from scratch, for everyone or the given students."
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_ids', nargs='*', type=int)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_student_stats(options['student_ids'] or None, chunk_size=options['chunk_size'])
+        self.stdout.write(f"Rebuilt rollups for {count} students in {time.perf_counter() - start:.2f}s.")
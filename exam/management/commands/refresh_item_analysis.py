@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exam.item_analysis import refresh_item_analysis
+from exam.models import Exam
+
+
+class Command(BaseCommand):
+    help = "Fold new attempts into the materialized item analysis of each exam (or the given ones)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.all()
+        if options['exam_ids']:
+            exams = exams.filter(id__in=options['exam_ids'])
+        for exam in exams:
+            start = time.perf_counter()
+            analysis = refresh_item_analysis(exam)
+            kr20 = f"{analysis.kr20:.2f}" if analysis.kr20 is not None else 'n/a'
+            self.stdout.write(
+                f"{exam.title}: {analysis.attempt_count} attempts, KR-20 {kr20} "
+                f"({time.perf_counter() - start:.2f}s)"
+            )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exam.models import Exam
+from exam.regrade import regrade_exam
+
+
+class Command(BaseCommand):
+    help = "Recompute every attempt's score for an exam against its current answer key."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without saving them.')
+        parser.add_argument('--show', type=int, default=20, help='Number of changed attempts to list.')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist.")
+
+        start = time.perf_counter()
+        report = regrade_exam(exam, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        seconds = time.perf_counter() - start
+
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(
+            f"{exam.title}: {report['attempts']} attempts regraded in {seconds:.2f}s, {report['changed']} {verb}."
+        )
+        for change in report['changes'][:options['show']]:
+            self.stdout.write(
+                f"  attempt {change['attempt']} (student {change['student']}): "
+                f"{change['old_score']:.2f}% -> {change['new_score']:.2f}%"
+            )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exam.db_router import analytics_db, sync_replica
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the analytics replica (EXAM_ANALYTICS_DB).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep syncing every N seconds')
+
+    def handle(self, *args, **options):
+        alias = analytics_db()
+        if not alias:
+            raise CommandError('EXAM_ANALYTICS_DB is not set.')
+        while True:
+            start = time.perf_counter()
+            try:
+                sync_replica(alias)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'Synced {alias} in {time.perf_counter() - start:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0012_alter_teacherprofile_bio_alter_teacherprofile_phone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
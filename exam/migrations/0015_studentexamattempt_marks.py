@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0014_queuedsubmission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='answered_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='correct_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='marks_earned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='total_marks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+from django.db.models import Count, F, Q, Sum
+
+
+CHUNK_SIZE = 500
+
+
+def backfill_attempt_marks(apps, schema_editor):
+    Question = apps.get_model('exam', 'Question')
+    StudentAnswer = apps.get_model('exam', 'StudentAnswer')
+    StudentExamAttempt = apps.get_model('exam', 'StudentExamAttempt')
+
+    exam_totals = dict(
+        Question.objects.values('exam_id')
+        .annotate(total=Sum('marks'))
+        .values_list('exam_id', 'total')
+    )
+
+    last_id = 0
+    while True:
+        attempts = list(
+            StudentExamAttempt.objects.filter(id__gt=last_id).order_by('id')[:CHUNK_SIZE]
+        )
+        if not attempts:
+            break
+        last_id = attempts[-1].id
+
+        correct = Q(selected_option=F('question__correct_option'))
+        rows = (
+            StudentAnswer.objects.filter(attempt_id__in=[a.id for a in attempts])
+            .values('attempt_id')
+            .annotate(
+                answered=Count('id'),
+                correct=Count('id', filter=correct),
+                earned=Sum('question__marks', filter=correct),
+            )
+        )
+        stats = {row['attempt_id']: row for row in rows}
+
+        for attempt in attempts:
+            row = stats.get(attempt.id, {})
+            attempt.answered_count = row.get('answered') or 0
+            attempt.correct_count = row.get('correct') or 0
+            attempt.marks_earned = row.get('earned') or 0
+            attempt.total_marks = exam_totals.get(attempt.exam_id) or 0
+
+        StudentExamAttempt.objects.bulk_update(
+            attempts, ['answered_count', 'correct_count', 'marks_earned', 'total_marks']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0015_studentexamattempt_marks'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_attempt_marks, migrations.RunPython.noop),
+    ]
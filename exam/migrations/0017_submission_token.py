@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0016_backfill_attempt_marks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedsubmission',
+            name='submission_token',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='submission_token',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0017_submission_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='packed_answers',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AnswerLayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('question_ids', models.JSONField(default=list)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_layouts', to='exam.exam')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='answer_layout',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attempts', to='exam.answerlayout'),
+        ),
+        migrations.AddConstraint(
+            model_name='answerlayout',
+            constraint=models.UniqueConstraint(fields=('exam', 'version'), name='unique_answer_layout_per_exam_version'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0019_answerdraft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='admission_burst',
+            field=models.PositiveIntegerField(blank=True, help_text='Opens admitted at once before rate limiting', null=True),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='admission_concurrency',
+            field=models.PositiveIntegerField(blank=True, help_text='Requests handled at once per app process', null=True),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='admission_rate',
+            field=models.FloatField(blank=True, help_text='Exam opens admitted per second', null=True),
+        ),
+    ]
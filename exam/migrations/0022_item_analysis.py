@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0021_contentversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam_version', models.PositiveIntegerField(default=0)),
+                ('last_attempt_id', models.BigIntegerField(default=0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('sum_totals', models.BigIntegerField(default=0)),
+                ('sum_totals_sq', models.BigIntegerField(default=0)),
+                ('kr20', models.FloatField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='item_analysis', to='exam.exam')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ItemStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('correct_count', models.PositiveIntegerField(default=0)),
+                ('sum_totals_correct', models.BigIntegerField(default=0)),
+                ('option1_count', models.PositiveIntegerField(default=0)),
+                ('option2_count', models.PositiveIntegerField(default=0)),
+                ('option3_count', models.PositiveIntegerField(default=0)),
+                ('option4_count', models.PositiveIntegerField(default=0)),
+                ('p_value', models.FloatField(blank=True, null=True)),
+                ('discrimination', models.FloatField(blank=True, null=True)),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='exam.itemanalysis')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exam.question')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('analysis', 'question'), name='unique_item_statistic_per_question')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0022_item_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamStats',
+            fields=[
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='exam.exam')),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('question_count', models.PositiveIntegerField(default=0)),
+                ('total_marks', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0.0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+CHUNK_SIZE = 500
+
+
+def backfill_exam_stats(apps, schema_editor):
+    Exam = apps.get_model('exam', 'Exam')
+    ExamStats = apps.get_model('exam', 'ExamStats')
+    Question = apps.get_model('exam', 'Question')
+    StudentExamAttempt = apps.get_model('exam', 'StudentExamAttempt')
+
+    ids = list(Exam.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        questions = {
+            row['exam_id']: row
+            for row in Question.objects.filter(exam_id__in=chunk).values('exam_id')
+            .annotate(count=Count('id'), marks=Sum('marks'))
+        }
+        attempts = {
+            row['exam_id']: row
+            for row in StudentExamAttempt.objects.filter(exam_id__in=chunk).values('exam_id')
+            .annotate(count=Count('id'), score_sum=Sum('score'))
+        }
+        ExamStats.objects.bulk_create([
+            ExamStats(
+                exam_id=exam_id,
+                question_count=questions.get(exam_id, {}).get('count') or 0,
+                total_marks=questions.get(exam_id, {}).get('marks') or 0,
+                submission_count=attempts.get(exam_id, {}).get('count') or 0,
+                score_sum=attempts.get(exam_id, {}).get('score_sum') or 0.0,
+            )
+            for exam_id in chunk
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0023_examstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_exam_stats, migrations.RunPython.noop),
+    ]
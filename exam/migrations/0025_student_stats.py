@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_feedback'),
+        ('exam', '0024_backfill_examstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentExamBest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('best_score', models.FloatField(default=0.0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentStats',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='exam_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0.0)),
+                ('best_score', models.FloatField(blank=True, null=True)),
+                ('latest_score', models.FloatField(blank=True, null=True)),
+                ('latest_submitted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studentexamattempt',
+            index=models.Index(fields=['student', 'submitted_at', 'id'], name='attempt_student_submitted'),
+        ),
+        migrations.AddField(
+            model_name='studentexambest',
+            name='exam',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_bests', to='exam.exam'),
+        ),
+        migrations.AddField(
+            model_name='studentexambest',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_bests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='studentexambest',
+            constraint=models.UniqueConstraint(fields=('student', 'exam'), name='unique_exam_best_per_student'),
+        ),
+    ]
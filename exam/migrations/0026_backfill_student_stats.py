@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import migrations
+
+
+CHUNK_SIZE = 500
+
+
+def backfill_student_stats(apps, schema_editor):
+    StudentExamAttempt = apps.get_model('exam', 'StudentExamAttempt')
+    StudentExamBest = apps.get_model('exam', 'StudentExamBest')
+    StudentStats = apps.get_model('exam', 'StudentStats')
+
+    ids = sorted(set(StudentExamAttempt.objects.values_list('student_id', flat=True)))
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        stats = {student_id: StudentStats(student_id=student_id) for student_id in chunk}
+        bests = {}
+        rows = (
+            StudentExamAttempt.objects.filter(student_id__in=chunk)
+            .order_by('student_id', 'submitted_at', 'id')
+            .values_list('student_id', 'exam_id', 'score', 'submitted_at')
+        )
+        for student_id, exam_id, score, submitted_at in rows:
+            row = stats[student_id]
+            row.attempt_count += 1
+            row.score_sum += score
+            row.best_score = score if row.best_score is None else max(row.best_score, score)
+            row.latest_score = score
+            row.latest_submitted_at = submitted_at
+
+            best = bests.get((student_id, exam_id))
+            if best is None:
+                best = bests[(student_id, exam_id)] = StudentExamBest(student_id=student_id, exam_id=exam_id, best_score=score)
+            best.best_score = max(best.best_score, score)
+            best.attempt_count += 1
+
+        StudentStats.objects.bulk_create(stats.values())
+        StudentExamBest.objects.bulk_create(bests.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0025_student_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_student_stats, migrations.RunPython.noop),
+    ]
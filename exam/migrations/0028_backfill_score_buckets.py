@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_score_buckets(apps, schema_editor):
+    ScoreBucket = apps.get_model('exam', 'ScoreBucket')
+    StudentExamAttempt = apps.get_model('exam', 'StudentExamAttempt')
+
+    # same 0.01% buckets as exam.ranking.bucket_for
+    buckets = {}
+    rows = StudentExamAttempt.objects.values('exam_id', 'score').annotate(count=Count('id'))
+    for row in rows.values_list('exam_id', 'score', 'count'):
+        exam_id, score, count = row
+        key = (exam_id, min(max(int(round(score * 100)), 0), 10000))
+        buckets[key] = buckets.get(key, 0) + count
+
+    ScoreBucket.objects.bulk_create(
+        [ScoreBucket(exam_id=exam_id, bucket=bucket, count=count) for (exam_id, bucket), count in buckets.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0027_score_buckets'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_score_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_student_usernames(apps, schema_editor):
+    StudentExamAttempt = apps.get_model('exam', 'StudentExamAttempt')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    StudentExamAttempt.objects.update(
+        student_username=Subquery(User.objects.filter(pk=OuterRef('student_id')).values('username')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0028_backfill_score_buckets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='student_username',
+            field=models.CharField(blank=True, editable=False, max_length=150),
+        ),
+        migrations.RunPython(copy_student_usernames, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='studentexamattempt',
+            index=models.Index(fields=['exam', 'submitted_at', 'id'], name='attempt_exam_submitted'),
+        ),
+        migrations.AddIndex(
+            model_name='studentexamattempt',
+            index=models.Index(fields=['exam', 'student_username', 'id'], name='attempt_exam_student'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0029_submission_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='studentexamattempt',
+            name='attempt_exam_score',
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['date', 'id'], name='exam_date'),
+        ),
+        migrations.AddIndex(
+            model_name='studentexamattempt',
+            index=models.Index(fields=['student', 'exam', 'submitted_at'], name='attempt_student_exam'),
+        ),
+        migrations.AddIndex(
+            model_name='studentexamattempt',
+            index=models.Index(fields=['exam', '-score', '-id'], name='attempt_exam_score'),
+        ),
+    ]
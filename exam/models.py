@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 
+from .packed_answers import PackedAnswer, unpack_selections
+
 # Create your models here.
 
 class Exam(models.Model):
@@ -9,6 +11,13 @@ class Exam(models.Model):
     date = models.DateField()
     total_marks = models.IntegerField()
     duration_minutes = models.PositiveIntegerField(default=5)
+    # bumped whenever the exam or any of its questions change (see exam/signals.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    # admission control overrides, blank uses settings.EXAM_ADMISSION (see exam/admission.py)
+    admission_rate = models.FloatField(null=True, blank=True, help_text='Exam opens admitted per second')
+    admission_burst = models.PositiveIntegerField(null=True, blank=True, help_text='Opens admitted at once before rate limiting')
+    admission_concurrency = models.PositiveIntegerField(null=True, blank=True, help_text='Requests handled at once per app process')
 
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
@@ -18,9 +27,26 @@ class Exam(models.Model):
         related_name='exams'
     )
 
+    class Meta:
+        indexes = [
+            # the home page lists exams newest first
+            models.Index(fields=['date', 'id'], name='exam_date'),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # version only ever moves through the F('version') + 1 update in
+        # exam/signals.py, so saving an instance loaded before the last
+        # change can't roll it back to a version other processes cached
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'version'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Question(models.Model):
     exam = models.ForeignKey(
@@ -47,6 +73,21 @@ class Question(models.Model):
         return self.question_text
 
 
+class AnswerLayout(models.Model):
+    # Frozen question order for one exam version, used by packed attempts
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='answer_layouts')
+    version = models.PositiveIntegerField()
+    question_ids = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'version'], name='unique_answer_layout_per_exam_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam.title} v{self.version}"
+
+
 
 #for Student
 
@@ -59,10 +100,93 @@ class StudentExamAttempt(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='attempts')
     submitted_at = models.DateTimeField(auto_now_add=True)
     score = models.FloatField(default=0.0)
+    # copy of student.username so view_submissions can sort by name from an index
+    student_username = models.CharField(max_length=150, blank=True, editable=False)
+
+    # filled in at grading time so result/history/profile pages never re-scan answers
+    marks_earned = models.PositiveIntegerField(default=0)
+    total_marks = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)
+
+    # one-time token issued by attempt_exam, unique so replays can't create a second attempt
+    submission_token = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    # packed storage mode (EXAM_PACKED_ANSWERS): selections are kept here
+    # instead of StudentAnswer rows, see exam/packed_answers.py
+    answer_layout = models.ForeignKey(AnswerLayout, on_delete=models.PROTECT, null=True, blank=True, related_name='attempts')
+    packed_answers = models.BinaryField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # student_exam_history pages through this newest first
+            models.Index(fields=['student', 'submitted_at', 'id'], name='attempt_student_submitted'),
+            # exam_instructions_view: a student's latest attempt at one exam
+            models.Index(fields=['student', 'exam', 'submitted_at'], name='attempt_student_exam'),
+            # leaderboard and view_submissions: attempts of an exam by score,
+            # date or student name. Keyset pages break ties on id in the same
+            # direction as the sort, so score is (-score, -id) read either way
+            models.Index(fields=['exam', '-score', '-id'], name='attempt_exam_score'),
+            models.Index(fields=['exam', 'submitted_at', 'id'], name='attempt_exam_submitted'),
+            models.Index(fields=['exam', 'student_username', 'id'], name='attempt_exam_student'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.exam.title}"
 
+    def save(self, *args, **kwargs):
+        if not self.student_username and self.student_id:
+            self.student_username = self.student.username
+        super().save(*args, **kwargs)
+
+    @property
+    def is_packed(self):
+        return self.answer_layout_id is not None
+
+    def get_selections(self):
+        # {question_id: selected_option} for either storage mode
+        if self.is_packed:
+            return unpack_selections(self.answer_layout.question_ids, self.packed_answers)
+        return dict(self.answers.values_list('question_id', 'selected_option'))
+
+    def get_answer_sheet(self):
+        """
+        Every question of the exam in order, answered or not, with the
+        selected and correct option text already filled in. Runs two
+        queries (one for packed attempts whose answer_layout is loaded),
+        however many questions there are.
+        """
+        selections = self.get_selections()
+        questions = Question.objects.filter(exam_id=self.exam_id).order_by('id').values_list(
+            'id', 'question_text', 'marks', 'correct_option', 'option1', 'option2', 'option3', 'option4',
+        )
+        sheet = []
+        for number, (question_id, text, marks, correct, *options) in enumerate(questions, start=1):
+            selected = selections.get(question_id)
+            sheet.append({
+                'number': number,
+                'question_text': text,
+                'marks': marks,
+                'selected_option': selected,
+                'selected_text': options[selected - 1] if selected else None,
+                'correct_text': options[correct - 1] if 1 <= correct <= 4 else '',
+                'is_correct': selected == correct,
+            })
+        return sheet
+
+    def get_answers(self):
+        # Answered questions in question order, each with .question and
+        # .selected_option like a StudentAnswer row
+        if not self.is_packed:
+            return self.answers.select_related('question').order_by('question_id')
+        selections = self.get_selections()
+        questions = Question.objects.in_bulk(list(selections))
+        return [
+            PackedAnswer(self, questions[qid], option)
+            for qid, option in selections.items()
+            if qid in questions
+        ]
+
 class StudentAnswer(models.Model):
     attempt = models.ForeignKey(StudentExamAttempt, on_delete=models.CASCADE, related_name='answers')
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
@@ -77,6 +201,181 @@ class StudentAnswer(models.Model):
         return f"Answer to {self.question.id} by {self.attempt.student.username}"
 
 
+class AnswerDraft(models.Model):
+    # In-progress answers saved by the attempt page, see exam/drafts.py
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='answer_drafts')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='answer_drafts')
+    selections = models.JSONField(default=dict)
+    # token of the attempt page that saved it; once that token is submitted
+    # the draft is stale and ignored (see exam/drafts.py)
+    submission_token = models.UUIDField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'exam'], name='unique_answer_draft_per_student_exam'),
+        ]
+
+    def __str__(self):
+        return f"Draft of {self.exam.title} by {self.student.username}"
+
+
+class QueuedSubmission(models.Model):
+    # Outbox row for submissions that are graded later by
+    # `manage.py grade_submissions` (EXAM_QUEUED_GRADING = True)
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='queued_submissions')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='queued_submissions')
+    selections = models.JSONField(default=dict)
+    submission_token = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempt = models.OneToOneField(StudentExamAttempt, on_delete=models.SET_NULL, null=True, blank=True, related_name='queued_submission')
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.exam.title} ({self.status})"
+
+
+class ExamStats(models.Model):
+    # Per-exam counters for the teacher dashboard, kept up to date by
+    # exam/signals.py (see exam/exam_stats.py). Rebuild with
+    # `manage.py rebuild_exam_stats` if they ever drift.
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    submission_count = models.PositiveIntegerField(default=0)
+    question_count = models.PositiveIntegerField(default=0)
+    total_marks = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
+    # bumped on every change to the row or the exam's score buckets;
+    # exam/ranking.py keys its cached rank index on it
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    @property
+    def mean_score(self):
+        return self.score_sum / self.submission_count if self.submission_count else None
+
+    def __str__(self):
+        return f"Stats of {self.exam.title}"
+
+
+class ScoreBucket(models.Model):
+    # Score histogram of an exam's attempts in 0.01% buckets, kept up to
+    # date by exam/signals.py. exam/ranking.py builds its rank index from it.
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='score_buckets')
+    bucket = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'bucket'], name='unique_score_bucket_per_exam'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam.title}: {self.bucket / 100}% x {self.count}"
+
+
+class StudentStats(models.Model):
+    # Per-student rollup for student_profile, kept up to date at grading
+    # time by exam/signals.py (see exam/exam_stats.py)
+    student = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='exam_stats')
+    attempt_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
+    best_score = models.FloatField(null=True, blank=True)
+    latest_score = models.FloatField(null=True, blank=True)
+    latest_submitted_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def mean_score(self):
+        return self.score_sum / self.attempt_count if self.attempt_count else None
+
+    def __str__(self):
+        return f"Stats of {self.student.username}"
+
+
+class StudentExamBest(models.Model):
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='exam_bests')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='student_bests')
+    best_score = models.FloatField(default=0.0)
+    attempt_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'exam'], name='unique_exam_best_per_student'),
+        ]
+
+    def __str__(self):
+        return f"Best of {self.student.username} in {self.exam.title}"
+
+
+class ItemAnalysis(models.Model):
+    # Materialized item-analysis report of one exam, see exam/item_analysis.py.
+    # Running sums cover every attempt up to `last_attempt_id`, so new
+    # attempts are folded in without re-reading the old ones.
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='item_analysis')
+    exam_version = models.PositiveIntegerField(default=0)
+    last_attempt_id = models.BigIntegerField(default=0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    # totals are the number of correct answers per attempt
+    sum_totals = models.BigIntegerField(default=0)
+    sum_totals_sq = models.BigIntegerField(default=0)
+    kr20 = models.FloatField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Item analysis of {self.exam.title}"
+
+
+class ItemStatistic(models.Model):
+    analysis = models.ForeignKey(ItemAnalysis, on_delete=models.CASCADE, related_name='items')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    correct_count = models.PositiveIntegerField(default=0)
+    # sum of the attempt totals over the attempts that got this question right
+    sum_totals_correct = models.BigIntegerField(default=0)
+    option1_count = models.PositiveIntegerField(default=0)
+    option2_count = models.PositiveIntegerField(default=0)
+    option3_count = models.PositiveIntegerField(default=0)
+    option4_count = models.PositiveIntegerField(default=0)
+    p_value = models.FloatField(null=True, blank=True)
+    discrimination = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['analysis', 'question'], name='unique_item_statistic_per_question'),
+        ]
+
+    def __str__(self):
+        return f"Statistics of question {self.question_id}"
+
+
+class ContentVersion(models.Model):
+    # Change counters used as cheap ETag / Last-Modified validators, see
+    # exam/conditional.py. `scope` is e.g. "exams", "exam:12" or "attempts:7".
+    scope = models.CharField(max_length=64, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
 class StudentProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=100)
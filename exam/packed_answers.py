@@ -0,0 +1,46 @@
+"""
+Packed answer vectors.
+
+Each selection takes one nibble (4 bits), two questions per byte, in the
+order of a frozen question id list (AnswerLayout.question_ids). 0 means the
+question was not answered, 1-4 is the chosen option.
+"""
+
+
+def pack_selections(question_ids, selections):
+    packed = bytearray((len(question_ids) + 1) // 2)
+    for i, question_id in enumerate(question_ids):
+        option = selections.get(question_id, 0)
+        if option:
+            packed[i // 2] |= option << (4 * (i % 2))
+    return bytes(packed)
+
+
+def unpack_selections(question_ids, packed):
+    # Returns {question_id: option} for answered questions only
+    packed = bytes(packed or b'')
+    selections = {}
+    for i, question_id in enumerate(question_ids):
+        if i // 2 >= len(packed):
+            break
+        option = (packed[i // 2] >> (4 * (i % 2))) & 0x0F
+        if option:
+            selections[question_id] = option
+    return selections
+
+
+class PackedAnswer:
+    # Same attributes the templates read from a StudentAnswer row
+    __slots__ = ('attempt', 'question', 'selected_option')
+
+    def __init__(self, attempt, question, selected_option):
+        self.attempt = attempt
+        self.question = question
+        self.selected_option = selected_option
+
+    @property
+    def question_id(self):
+        return self.question.id
+
+    def get_selected_option_display(self):
+        return f"Option {self.selected_option}"
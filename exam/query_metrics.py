@@ -0,0 +1,217 @@
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+
+# slowest statements kept per view
+SLOWEST_KEPT = 5
+
+_local = threading.local()
+
+
+def metrics_sample_rate():
+    # fraction of requests measured by QueryMetricsMiddleware, 0 turns it off
+    return getattr(settings, 'EXAM_QUERY_METRICS_SAMPLE_RATE', 0.0)
+
+
+def query_budget(max_queries):
+    """
+    Declare how many queries a view may run. Checked by
+    exam.testing.QueryBudgetMixin in tests and counted as over budget in
+    the collected metrics.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class RequestMetrics:
+    """
+    Queries (alias, sql, seconds) and template render time collected while
+    active. Render time includes the queries run from templates.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.render_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, time.perf_counter() - start))
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_seconds(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def by_alias(self):
+        counts = {}
+        for alias, _, seconds in self.queries:
+            count, total = counts.get(alias, (0, 0.0))
+            counts[alias] = (count + 1, total + seconds)
+        return counts
+
+    def slowest(self, n=SLOWEST_KEPT):
+        return sorted(self.queries, key=lambda query: query[2], reverse=True)[:n]
+
+    def repeated(self):
+        # statements run more than once, most repeated first (usually an N+1)
+        counts = {}
+        for _, sql, _ in self.queries:
+            counts[sql] = counts.get(sql, 0) + 1
+        return sorted(((n, sql) for sql, n in counts.items() if n > 1), reverse=True)
+
+
+def _install_render_timer():
+    # Times the outermost Template.render of each collected block; included
+    # and extended templates render inside it
+    if getattr(Template.render, 'metrics_timed', False):
+        return
+    original = Template.render
+
+    def render(self, context):
+        active = getattr(_local, 'active', None)
+        if not active or getattr(_local, 'rendering', False):
+            return original(self, context)
+        _local.rendering = True
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            _local.rendering = False
+            for metrics in active:
+                metrics.render_seconds += elapsed
+
+    render.metrics_timed = True
+    Template.render = render
+
+
+@contextmanager
+def collect_metrics():
+    # Collect the queries and render time of this thread, on every alias
+    _install_render_timer()
+    metrics = RequestMetrics()
+    if not hasattr(_local, 'active'):
+        _local.active = []
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        _local.active.append(metrics)
+        try:
+            yield metrics
+        finally:
+            _local.active.remove(metrics)
+
+
+class QueryMetricsStore:
+    """Per view totals of the sampled requests, for this app process."""
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view_name, budget, metrics, total_seconds):
+        with self._lock:
+            view = self._views.setdefault(view_name, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'over_budget': 0, 'budget': budget,
+                'db_seconds': 0.0, 'render_seconds': 0.0, 'total_seconds': 0.0, 'aliases': {}, 'slowest': [],
+            })
+            view['requests'] += 1
+            view['queries'] += metrics.query_count
+            view['max_queries'] = max(view['max_queries'], metrics.query_count)
+            if budget is not None and metrics.query_count > budget:
+                view['over_budget'] += 1
+            view['db_seconds'] += metrics.db_seconds
+            view['render_seconds'] += metrics.render_seconds
+            view['total_seconds'] += total_seconds
+            for alias, (count, seconds) in metrics.by_alias().items():
+                alias_count, alias_seconds = view['aliases'].get(alias, (0, 0.0))
+                view['aliases'][alias] = (alias_count + count, alias_seconds + seconds)
+            slowest = view['slowest'] + [(seconds, alias, sql) for alias, sql, seconds in metrics.slowest()]
+            view['slowest'] = sorted(slowest, reverse=True)[:SLOWEST_KEPT]
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for name, view in self._views.items():
+                n = view['requests']
+                stats[name] = {
+                    'requests': n,
+                    'budget': view['budget'],
+                    'over_budget': view['over_budget'],
+                    'avg_queries': view['queries'] / n,
+                    'max_queries': view['max_queries'],
+                    'avg_db_ms': view['db_seconds'] / n * 1000,
+                    'avg_render_ms': view['render_seconds'] / n * 1000,
+                    'avg_total_ms': view['total_seconds'] / n * 1000,
+                    'aliases': {
+                        alias: {'queries': count, 'db_ms': seconds * 1000}
+                        for alias, (count, seconds) in view['aliases'].items()
+                    },
+                    'slowest': [
+                        {'ms': seconds * 1000, 'alias': alias, 'sql': sql}
+                        for seconds, alias, sql in view['slowest']
+                    ],
+                }
+            return stats
+
+    def alias_totals(self):
+        # queries and DB time per database alias over all views
+        totals = {}
+        with self._lock:
+            for view in self._views.values():
+                for alias, (count, seconds) in view['aliases'].items():
+                    total = totals.setdefault(alias, {'queries': 0, 'db_ms': 0.0})
+                    total['queries'] += count
+                    total['db_ms'] += seconds * 1000
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+
+metrics_store = QueryMetricsStore()
+
+
+class QueryMetricsMiddleware:
+    """
+    Measures a sample of requests (EXAM_QUERY_METRICS_SAMPLE_RATE) and adds
+    them to metrics_store under the resolved URL name. Unsampled requests
+    only pay for one random() call. Queries run while a streaming response
+    is being sent are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = metrics_sample_rate()
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            view_name = match.view_name or match.route
+            budget = getattr(match.func, 'query_budget', None)
+        else:
+            view_name, budget = 'unresolved', None
+        metrics_store.record(view_name, budget, metrics, time.perf_counter() - start)
+        return response
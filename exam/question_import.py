@@ -0,0 +1,144 @@
+import csv
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from openpyxl import load_workbook
+
+from .exam_stats import refresh_question_stats
+from .forms import QuestionForm
+from .models import Question
+from .signals import bump_exam_version
+
+
+QUESTION_COLUMNS = list(QuestionForm._meta.fields)
+IMPORT_BATCH_SIZE = 500
+# errors kept for the report, the rest are only counted
+MAX_REPORTED_ERRORS = 200
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def _header_map(header):
+    columns = [str(name or '').strip().lower() for name in header]
+    missing = [name for name in QUESTION_COLUMNS if name not in columns and name != 'marks']
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}. Expected: {', '.join(QUESTION_COLUMNS)}.")
+    return {name: columns.index(name) for name in QUESTION_COLUMNS if name in columns}
+
+
+def _rows(values, start_line):
+    # (line number, {field: value}) for each non-blank row after the header
+    header = next(values, None)
+    if header is None:
+        raise ImportFileError('The file is empty.')
+    positions = _header_map(header)
+    default_marks = str(Question._meta.get_field('marks').default)
+    for line, row in enumerate(values, start=start_line):
+        if not any(str(value).strip() for value in row if value is not None):
+            continue
+        data = {
+            name: '' if i >= len(row) or row[i] is None else str(row[i]).strip()
+            for name, i in positions.items()
+        }
+        # an absent marks column or a blank cell means the model default
+        if not data.get('marks'):
+            data['marks'] = default_marks
+        yield line, data
+
+
+def read_question_rows(fileobj, filename):
+    """
+    Rows of a CSV or XLSX file in the QuestionForm field layout, read one
+    at a time so large files are never fully in memory.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+        try:
+            yield from _rows(csv.reader(text), start_line=2)
+        except UnicodeDecodeError:
+            raise ImportFileError('The CSV file is not UTF-8 encoded.')
+        finally:
+            text.detach()
+    elif ext == '.xlsx':
+        try:
+            workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        except Exception:
+            raise ImportFileError('The file is not a valid .xlsx workbook.')
+        try:
+            yield from _rows(workbook.active.iter_rows(values_only=True), start_line=2)
+        finally:
+            workbook.close()
+    else:
+        raise ImportFileError('Upload a .csv or .xlsx file.')
+
+
+def validate_rows(exam, rows):
+    """
+    Clean a batch of rows with QuestionForm's own fields.
+
+    The fields are built once per batch rather than one form per row, which
+    is what makes large files fast; QuestionForm has no form-level clean()
+    and Question no extra model validation, so the checks are the same.
+    Returns (questions, [(line, {field: [messages]})]).
+    """
+    fields = QuestionForm().fields
+    questions, errors = [], []
+    for line, data in rows:
+        cleaned, row_errors = {}, {}
+        for name, field in fields.items():
+            try:
+                cleaned[name] = field.clean(data.get(name, ''))
+            except ValidationError as e:
+                row_errors[name] = e.messages
+        if row_errors:
+            errors.append((line, row_errors))
+        else:
+            questions.append(Question(exam=exam, **cleaned))
+    return questions, errors
+
+
+def import_questions(exam, rows, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate `rows` in batches and bulk insert them into `exam`, all in one
+    transaction. A file with any invalid row imports nothing, so fixing it
+    and uploading it again never adds the valid rows twice.
+
+    bulk_create skips the Question signals, so the exam version, its caches
+    and its dashboard counters are updated once at the end instead. Returns
+    a report dict with the counts and the per-row errors.
+    """
+    report = {'valid': 0, 'imported': 0, 'invalid': 0, 'errors': [], 'dry_run': dry_run}
+
+    def process(batch):
+        questions, errors = validate_rows(exam, batch)
+        report['valid'] += len(questions)
+        report['invalid'] += len(errors)
+        for line, row_errors in errors[:MAX_REPORTED_ERRORS - len(report['errors'])]:
+            report['errors'].append({'line': line, 'errors': row_errors})
+        # after the first invalid row the rest is only checked
+        if questions and not dry_run and not report['invalid']:
+            Question.objects.bulk_create(questions)
+            report['imported'] += len(questions)
+
+    with transaction.atomic():
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                process(batch)
+                batch = []
+        process(batch)
+
+        if report['invalid']:
+            # undo the batches inserted before the first invalid row
+            transaction.set_rollback(True)
+            report['imported'] = 0
+        elif report['imported']:
+            bump_exam_version(exam.id)
+            refresh_question_stats(exam.id)
+    return report
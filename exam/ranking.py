@@ -0,0 +1,99 @@
+from array import array
+
+from django.conf import settings
+
+from .lru import SizedLRU
+from .models import ExamStats, ScoreBucket
+
+
+# Scores are percentages, bucketed to 0.01%
+BUCKETS = 10001
+
+
+def bucket_for(score):
+    return min(max(int(round(score * 100)), 0), BUCKETS - 1)
+
+
+class RankIndex:
+    """
+    Fenwick tree over an exam's score buckets.
+
+    Counting the attempts above or below a score and finding the score of
+    the k-th best attempt are O(log buckets), however many attempts there
+    are.
+    """
+
+    __slots__ = ('tree', 'total')
+
+    def __init__(self, counts=()):
+        self.tree = array('l', bytes(8 * (BUCKETS + 1)))
+        self.total = 0
+        for bucket, count in counts:
+            self.add(bucket, count)
+
+    def add(self, bucket, count=1):
+        self.total += count
+        i = bucket + 1
+        while i <= BUCKETS:
+            self.tree[i] += count
+            i += i & -i
+
+    def count_up_to(self, bucket):
+        # attempts in buckets 0..bucket
+        i, total = min(bucket + 1, BUCKETS), 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def rank(self, score):
+        """
+        (rank, percentile) of `score`: rank is 1 + the number of attempts
+        scoring higher, percentile the share of attempts scoring strictly
+        lower, so an attempt is never "better than" the ones it ties with.
+        """
+        bucket = bucket_for(score)
+        below = self.count_up_to(bucket - 1) if bucket else 0
+        above = self.total - self.count_up_to(bucket)
+        percentile = below / self.total * 100 if self.total else None
+        return above + 1, percentile
+
+    def kth_best_score(self, k):
+        # score of the k-th best attempt, None with fewer than k attempts
+        if k < 1 or k > self.total:
+            return None
+        target = self.total - k + 1  # same attempt counted from the bottom
+        pos, step = 0, 1 << BUCKETS.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= BUCKETS and self.tree[nxt] < target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos / 100
+
+    def nbytes(self):
+        return self.tree.itemsize * len(self.tree) + 100
+
+
+rank_cache = SizedLRU(
+    max_bytes=getattr(settings, 'EXAM_RANK_CACHE_BYTES', 8 * 1024 * 1024),
+    max_entries=getattr(settings, 'EXAM_RANK_CACHE_ENTRIES', 256),
+    sizeof=RankIndex.nbytes,
+)
+
+
+def get_rank_index(exam_id):
+    # The exam's stats version moves with every graded, deleted or regraded
+    # attempt, so it doubles as the cache key: one primary key lookup per
+    # call, and a rebuild from the (few) non-empty buckets when it moved on
+    version = ExamStats.objects.filter(exam_id=exam_id).values_list('version', flat=True).first()
+    cache_key = (exam_id, version)
+    index = rank_cache.get(cache_key)
+    if index is None:
+        rank_cache.invalidate(exam_id)
+        index = RankIndex(
+            ScoreBucket.objects.filter(exam_id=exam_id, count__gt=0).values_list('bucket', 'count')
+        )
+        rank_cache.put(cache_key, index)
+    return index
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .answer_keys import answer_key_cache
+from .conditional import bump_versions
+from .exam_papers import paper_cache
+from .exam_stats import (
+    rebuild_exam_stats, rebuild_student_stats, record_attempt_added, record_attempt_removed, refresh_question_stats,
+)
+from .models import Exam, ExamStats, Question, StudentExamAttempt
+
+
+def invalidate_exam_caches(exam_id):
+    answer_key_cache.invalidate(exam_id)
+    paper_cache.invalidate(exam_id)
+
+
+def bump_exam_version(exam_id):
+    # update() does not fire signals, so this cannot recurse into exam_saved
+    Exam.objects.filter(id=exam_id).update(version=F('version') + 1)
+    invalidate_exam_caches(exam_id)
+    bump_versions(f'exam:{exam_id}')
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_exam_version(instance.exam_id)
+    refresh_question_stats(instance.exam_id)
+
+
+@receiver(post_save, sender=Exam)
+def exam_saved(sender, instance, created, **kwargs):
+    bump_versions('exams')
+    if created:
+        ExamStats.objects.get_or_create(exam=instance)
+        invalidate_exam_caches(instance.id)
+    else:
+        bump_exam_version(instance.id)
+        instance.refresh_from_db(fields=['version'])
+
+
+@receiver(post_delete, sender=Exam)
+def exam_deleted(sender, instance, **kwargs):
+    invalidate_exam_caches(instance.id)
+    bump_versions('exams', f'exam:{instance.id}')
+
+
+@receiver(post_save, sender=StudentExamAttempt)
+def attempt_saved(sender, instance, created, **kwargs):
+    # only the set of attempts matters to conditional pages, not score updates
+    if created:
+        bump_versions(f'attempts:{instance.student_id}')
+        record_attempt_added(instance)
+    else:
+        # the score may have been edited and the old one is not known here
+        rebuild_exam_stats([instance.exam_id])
+        rebuild_student_stats([instance.student_id])
+
+
+@receiver(post_delete, sender=StudentExamAttempt)
+def attempt_deleted(sender, instance, **kwargs):
+    bump_versions(f'attempts:{instance.student_id}')
+    record_attempt_removed(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # keep the username copied onto attempts current (logins only save last_login)
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    StudentExamAttempt.objects.filter(student=instance).exclude(student_username=instance.username).update(
+        student_username=instance.username,
+    )
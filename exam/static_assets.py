@@ -0,0 +1,106 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+from PIL import Image, ImageOps
+
+try:
+    import brotli
+except ImportError:  # optional, only gzip variants are written without it
+    brotli = None
+
+try:
+    from pillow_heif import register_heif_opener
+except ImportError:  # optional, .heic sources are skipped without it
+    register_heif_opener = None
+else:
+    register_heif_opener()
+
+
+# Text assets worth compressing ahead of time
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.html', '.txt', '.json', '.xml', '.ico', '.map'}
+MIN_COMPRESS_BYTES = 256
+
+# Source images get a resized .webp copy next to them (photo.png -> photo.webp)
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.heic', '.heif'}
+HEIF_EXTENSIONS = {'.heic', '.heif'}
+# Formats browsers cannot show; left out of collectstatic once converted
+SOURCE_ONLY_PATTERNS = ['*.heic', '*.heif']
+
+# Hashed names never change content, so clients may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def compress_variants(content):
+    # (suffix, encoded bytes) for each encoding that actually saves space
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    return [(suffix, data) for suffix, data in variants if len(data) < len(content) * 0.95]
+
+
+def optimize_image(path, max_width=1600, quality=80):
+    """
+    Write a web-sized .webp copy of the image at `path`. Returns the output
+    path, or None when it is already up to date or the format cannot be read.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in HEIF_EXTENSIONS and register_heif_opener is None:
+        return None
+    out = os.path.splitext(path)[0] + '.webp'
+    if os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(path):
+        return None
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > max_width:
+            image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        image.save(out, 'WEBP', quality=quality, method=6)
+    return out
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files (styles.<hash>.css) plus precompressed
+    .gz / .br copies of every text asset, written during collectstatic.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                content = f.read()
+            if len(content) < MIN_COMPRESS_BYTES:
+                continue
+            for suffix, data in compress_variants(content):
+                path = self.path(name + suffix)
+                with open(path, 'wb') as out:
+                    out.write(data)
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            # missing file or collectstatic not run yet, use the plain URL
+            # instead of failing the whole page
+            return FileSystemStorage.url(self, name)
+
+    def is_hashed(self, name):
+        return name in self.hashed_files.values()
+
+
+def pick_encoding(root, path, accept_encoding):
+    # Returns (path to serve, encoding) preferring brotli, then gzip
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accepted and os.path.isfile(os.path.join(root, path + suffix)):
+            return path + suffix, encoding
+    return path, None
@@ -0,0 +1,134 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .answer_keys import get_answer_key
+from .grading import parse_selections, save_graded_attempt
+from .models import QueuedSubmission, StudentExamAttempt
+
+
+def queued_grading_enabled():
+    return getattr(settings, 'EXAM_QUEUED_GRADING', False)
+
+
+def enqueue_submission(student, exam, data, submission_token=None):
+    # Only validate and store the selections, grading happens in a worker
+    selections = parse_selections(data, get_answer_key(exam))
+    return QueuedSubmission.objects.create(
+        student=student,
+        exam=exam,
+        selections={str(qid): option for qid, option in selections.items()},
+        submission_token=submission_token,
+    )
+
+
+def claim_batch(worker_id, batch_size):
+    # The conditional UPDATE is a single statement, so two workers can never
+    # claim the same row even without SELECT ... FOR UPDATE on SQLite.
+    ids = list(
+        QueuedSubmission.objects.filter(status=QueuedSubmission.PENDING)
+        .order_by('id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    QueuedSubmission.objects.filter(id__in=ids, status=QueuedSubmission.PENDING).update(
+        status=QueuedSubmission.PROCESSING,
+        claimed_by=worker_id,
+        claimed_at=timezone.now(),
+    )
+    return list(
+        QueuedSubmission.objects.filter(status=QueuedSubmission.PROCESSING, claimed_by=worker_id)
+        .select_related('student', 'exam')
+        .order_by('id')
+    )
+
+
+def grade_item(item, answer_key):
+    # drop anything the key no longer contains (question deleted since submit)
+    selections = {
+        int(qid): option for qid, option in item.selections.items()
+        if int(qid) in answer_key
+    }
+    return save_graded_attempt(item.student, item.exam, answer_key, selections, item.submission_token)
+
+
+def process_batch(items):
+    # Grade claimed items in one transaction with a savepoint per item, so a
+    # bad submission is marked failed without losing the rest of the batch.
+    # Only lock / connection trouble (OperationalError) aborts the batch, for
+    # the worker to retry.
+    # Answer keys are loaded first so the transaction opens with a write;
+    # on SQLite that takes the write lock up front instead of failing to
+    # upgrade a read lock while other workers are writing.
+    # Returns the number graded successfully.
+    answer_keys = {item.exam_id: get_answer_key(item.exam) for item in items}
+    graded = 0
+    with transaction.atomic():
+        for item in items:
+            try:
+                with transaction.atomic():
+                    item.attempt = grade_item(item, answer_keys[item.exam_id])
+                    finish(item, QueuedSubmission.DONE)
+                graded += 1
+            except OperationalError:
+                raise
+            except IntegrityError as exc:
+                # the token is already on an attempt (graded elsewhere), point at it
+                item.attempt = None
+                if item.submission_token:
+                    item.attempt = StudentExamAttempt.objects.filter(submission_token=item.submission_token).first()
+                if item.attempt is not None:
+                    finish_or_skip(item, QueuedSubmission.DONE)
+                else:
+                    fail_or_skip(item, exc)
+            except Exception as exc:
+                item.attempt = None
+                fail_or_skip(item, exc)
+    return graded
+
+
+def finish(item, status, error=''):
+    item.status = status
+    item.error = error
+    item.processed_at = timezone.now()
+    item.save(update_fields=['attempt', 'status', 'error', 'processed_at'])
+
+
+def finish_or_skip(item, status, error=''):
+    # The item's row is gone when its student or exam was deleted after it
+    # was claimed; there is nobody left to report to
+    if QueuedSubmission.objects.filter(id=item.id).exists():
+        finish(item, status, error)
+
+
+def fail_or_skip(item, exc):
+    finish_or_skip(item, QueuedSubmission.FAILED, repr(exc))
+
+
+def requeue_stale(timeout_seconds):
+    # Put back items claimed by a worker that died before finishing them
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    return QueuedSubmission.objects.filter(
+        status=QueuedSubmission.PROCESSING, claimed_at__lt=cutoff
+    ).update(status=QueuedSubmission.PENDING, claimed_by='', claimed_at=None)
+
+
+def new_worker_id():
+    return uuid.uuid4().hex
+
+
+def queue_stats(window_seconds=60):
+    since = timezone.now() - timedelta(seconds=window_seconds)
+    graded_recently = QueuedSubmission.objects.filter(
+        status=QueuedSubmission.DONE, processed_at__gte=since
+    ).count()
+    return {
+        'pending': QueuedSubmission.objects.filter(status=QueuedSubmission.PENDING).count(),
+        'processing': QueuedSubmission.objects.filter(status=QueuedSubmission.PROCESSING).count(),
+        'failed': QueuedSubmission.objects.filter(status=QueuedSubmission.FAILED).count(),
+        'graded_per_second': graded_recently / window_seconds,
+    }
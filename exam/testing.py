@@ -0,0 +1,36 @@
+from .query_metrics import collect_metrics
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for the per-view query budgets declared with
+    @query_budget (see exam/query_metrics.py).
+
+        self.assertWithinQueryBudget(reverse('view_submissions', args=[exam.id]))
+
+    fails when the view runs more queries than its budget, listing the
+    repeated statements so an N+1 is easy to spot.
+    """
+
+    def assertWithinQueryBudget(self, url, budget=None, method='get', **kwargs):
+        with collect_metrics() as metrics:
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        view_name = response.resolver_match.view_name
+        if budget is None:
+            budget = getattr(response.resolver_match.func, 'query_budget', None)
+            if budget is None:
+                self.fail(f'{view_name} has no @query_budget')
+
+        if metrics.query_count > budget:
+            lines = [f'{view_name} ran {metrics.query_count} queries, budget is {budget}.']
+            repeated = metrics.repeated()
+            if repeated:
+                lines.append('Repeated statements:')
+                lines += [f'  {n}x {sql}' for n, sql in repeated]
+            else:
+                lines.append('Statements:')
+                lines += [f'  {sql}' for _, sql, _ in metrics.queries]
+            self.fail('\n'.join(lines))
+        return response
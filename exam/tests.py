@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import importlib
+import io
+import os
+import random
+import tempfile
+import time
+import uuid
+from concurrent.futures import Future
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps as django_apps
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+
+from accounts.models import User
+from . import grading
+from .admission import admission_controller
+from .answer_keys import answer_key_cache, get_answer_key
+from .db_router import PIN_COOKIE, sync_replica
+from .drafts import DraftBuffer, load_draft, write_drafts
+from .exam_papers import paper_cache
+from .exam_stats import rebuild_exam_stats, rebuild_student_stats
+from .exports import answer_matrix_rows
+from .grading import (
+    grade_submission, issue_submission_token, read_submission_token, save_graded_attempt, score_selections,
+)
+from .item_analysis import refresh_item_analysis
+from .models import (
+    ContentVersion, Exam, ExamStats, Question, QueuedSubmission, ScoreBucket, StudentAnswer, StudentExamAttempt,
+    StudentExamBest, StudentStats, TeacherProfile,
+)
+from .packed_answers import pack_selections, unpack_selections
+from .query_metrics import collect_metrics, metrics_store
+from .question_import import ImportFileError, import_questions, read_question_rows
+from .ranking import RankIndex, bucket_for, get_rank_index, rank_cache
+from .regrade import load_answers, regrade_exam
+from .static_assets import pick_encoding
+from .submission_queue import claim_batch, enqueue_submission, process_batch
+from .testing import QueryBudgetMixin
+from .views import static_asset
+from .write_lane import WriteLane
+
+
+def create_user(username, role='student'):
+    return User.objects.create_user(username, password='pw', role=role)
+
+
+def create_exam(teacher=None, question_count=1, title='Algebra', date=datetime.date(2025, 1, 1), correct_option=None):
+    # Questions are "Question i" with options a{i}..d{i}; the correct option
+    # cycles through 1-4 unless given
+    exam = Exam.objects.create(title=title, description='', date=date, total_marks=question_count, created_by=teacher)
+    questions = [
+        Question.objects.create(
+            exam=exam, question_text=f'Question {i}', option1=f'a{i}', option2=f'b{i}',
+            option3=f'c{i}', option4=f'd{i}', correct_option=correct_option or 1 + i % 4,
+        )
+        for i in range(question_count)
+    ]
+    return exam, questions
+
+
+def create_fixture(target, question_count=1):
+    # A teacher (with profile), a student and one exam of theirs, set on `target`
+    target.teacher = create_user('teacher', role='teacher')
+    TeacherProfile.objects.create(user=target.teacher)
+    target.student = create_user('student')
+    target.exam, target.questions = create_exam(target.teacher, question_count)
+    target.question = target.questions[0]
+
+
+def clear_process_caches():
+    # They are keyed by exam id, and ids come back once a test is rolled back
+    for cache in (answer_key_cache, paper_cache, rank_cache):
+        cache.clear()
+    grading._layouts.clear()
+
+
+class ExamTestCase(TestCase):
+    question_count = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        create_fixture(cls, cls.question_count)
+
+    def setUp(self):
+        clear_process_caches()
+
+
+class ConditionalGetTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+        self.url = reverse('question_list', args=[self.exam.id])
+
+    def test_unchanged_page_is_304_without_touching_exam_tables(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        touched = ' '.join(q['sql'] for q in queries.captured_queries)
+        for table in ('exam_exam', 'exam_question', 'exam_studentexamattempt'):
+            self.assertNotIn(table, touched)
+
+    def test_question_edit_changes_validators(self):
+        first = self.client.get(self.url)
+        self.question.question_text = 'Question 0, edited'
+        self.question.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertContains(response, 'Question 0, edited')
+
+    def backdate(self, seconds):
+        earlier = timezone.now() - datetime.timedelta(seconds=seconds)
+        ContentVersion.objects.update(updated_at=earlier)
+        User.objects.filter(pk=self.teacher.pk).update(last_login=earlier)
+
+    def test_if_modified_since(self):
+        self.backdate(5)
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified_within_the_changed_second(self):
+        # a second change in the same second would carry the same HTTP date
+        self.backdate(5)
+        first = self.client.get(self.url)
+        self.question.question_text = 'Question 0, edited'
+        self.question.save()
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_other_users_get_their_own_etag(self):
+        first = self.client.get(self.url)
+        other = create_user('other', role='admin')
+        self.client.force_login(other)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTests(ExamTestCase):
+    """
+    Run each hot view, take its main query (the ordered one on `table`) and
+    check SQLite's plan reads it from an index, not a table scan or a
+    separate sort.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(3):
+            StudentExamAttempt.objects.create(student=cls.student, exam=cls.exam, score=50 + i)
+
+    def main_query_plan(self, user, url, table):
+        if user:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        statements = [
+            q['sql'] for q in queries.captured_queries
+            if f'FROM "{table}"' in q['sql'] and 'ORDER BY' in q['sql']
+        ]
+        self.assertTrue(statements, f'no ordered query on {table}')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + statements[0])
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_uses_index(self, plan, table):
+        self.assertTrue(any(table in step and 'INDEX' in step for step in plan), plan)
+        self.assertFalse([step for step in plan if step.startswith(f'SCAN {table}') and 'INDEX' not in step], plan)
+        self.assertFalse([step for step in plan if 'TEMP B-TREE' in step], plan)
+
+    def test_home(self):
+        plan = self.main_query_plan(None, reverse('home'), 'exam_exam')
+        self.assert_uses_index(plan, 'exam_exam')
+
+    def test_exam_instructions(self):
+        plan = self.main_query_plan(self.student, reverse('exam_instructions', args=[self.exam.id]), 'exam_studentexamattempt')
+        self.assert_uses_index(plan, 'exam_studentexamattempt')
+
+    def test_student_exam_history(self):
+        plan = self.main_query_plan(self.student, reverse('student_exam_history'), 'exam_studentexamattempt')
+        self.assert_uses_index(plan, 'exam_studentexamattempt')
+
+    def test_view_submissions_filtered(self):
+        base = reverse('view_submissions', args=[self.exam.id])
+        # as if every filter matched too many rows to sort them
+        with patch('exam.pagination.SELECTIVE_ROWS', 1):
+            for query in ('?score_min=50', '?date_from=2025-01-01', '?score_min=50&sort=-score', '?date_from=2025-01-01&sort=score', '?sort=student_username'):
+                with self.subTest(query=query):
+                    plan = self.main_query_plan(self.teacher, base + query, 'exam_studentexamattempt')
+                    self.assert_uses_index(plan, 'exam_studentexamattempt')
+
+    def test_view_submissions_selective_filter(self):
+        # nothing matches, so the filter's own index finds that right away
+        # instead of walking the sort order's index through the whole exam
+        base = reverse('view_submissions', args=[self.exam.id])
+        for query, index in (
+            ('?sort=-score&date_from=2099-01-01', 'attempt_exam_submitted'),
+            ('?score_min=99.5', 'attempt_exam_score'),
+            ('?score_min=99.5&date_from=2025-01-01&sort=student_username', 'attempt_exam_score'),
+        ):
+            with self.subTest(query=query):
+                plan = self.main_query_plan(self.teacher, base + query, 'exam_studentexamattempt')
+                self.assertTrue(any(f'INDEX {index} ' in step for step in plan), plan)
+
+
+class QueryBudgetTests(QueryBudgetMixin, ExamTestCase):
+    """Every view with a @query_budget, over enough rows to expose an N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for e in range(3):
+            exam, questions = create_exam(cls.teacher, 5, title=f'Exam {e}', date=datetime.date(2025, 1, 2 + e))
+            for k in range(4):
+                other = create_user(f'student-{e}-{k}')
+                grade_submission(other, exam, {str(q.id): str(1 + k % 4) for q in questions})
+            cls.attempt = grade_submission(cls.student, exam, {str(q.id): '1' for q in questions[:-1]})
+        cls.exam = exam
+
+    def test_views_stay_within_budget(self):
+        teacher_urls = [
+            reverse('exam_list'),
+            reverse('question_list', args=[self.exam.id]),
+            reverse('teacher_dashboard'),
+            reverse('view_submissions', args=[self.exam.id]),
+            reverse('view_student_answers', args=[self.attempt.id]),
+            reverse('exam_leaderboard', args=[self.exam.id]),
+            reverse('item_analysis', args=[self.exam.id]),
+        ]
+        student_urls = [
+            reverse('home'),
+            reverse('student_exam_list'),
+            reverse('exam_instructions', args=[self.exam.id]),
+            reverse('student_exam_history'),
+            reverse('student_profile'),
+            reverse('student_exam_result', args=[self.attempt.id]),
+        ]
+        for user, urls in ((self.teacher, teacher_urls), (self.student, student_urls)):
+            self.client.force_login(user)
+            for url in urls:
+                with self.subTest(url=url):
+                    response = self.assertWithinQueryBudget(url)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_over_budget_fails_with_repeated_statements(self):
+        self.client.force_login(self.student)
+        with self.assertRaises(AssertionError) as failure:
+            self.assertWithinQueryBudget(reverse('student_exam_history'), budget=0)
+        self.assertIn('budget is 0', str(failure.exception))
+
+    def test_middleware_records_sampled_requests(self):
+        metrics_store.reset()
+        self.client.force_login(self.student)
+        with self.settings(EXAM_QUERY_METRICS_SAMPLE_RATE=1.0):
+            self.client.get(reverse('student_exam_history'))
+        stats = metrics_store.stats()['student_exam_history']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['budget'], 3)
+        self.assertGreater(stats['avg_queries'], 0)
+        self.assertIn('default', stats['aliases'])
+        self.assertGreater(stats['avg_render_ms'], 0)
+        metrics_store.reset()
+
+
+class ResultPageQueryTests(ExamTestCase):
+    """student_exam_result runs the same queries however many questions the exam has."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+
+    def result_page(self, question_count, packed):
+        exam, questions = create_exam(question_count=question_count, title=f'Exam {question_count}', correct_option=1)
+        # the last question is left unanswered
+        with self.settings(EXAM_PACKED_ANSWERS=packed):
+            attempt = grade_submission(self.student, exam, {str(q.id): '2' for q in questions[:-1]})
+        url = reverse('student_exam_result', args=[attempt.id])
+        self.client.get(url)  # warm the per-process caches
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_fixed(self):
+        for packed in (False, True):
+            with self.subTest(packed=packed):
+                small, small_count = self.result_page(3, packed)
+                large, large_count = self.result_page(30, packed)
+                self.assertEqual(small_count, large_count)
+                # session, user, attempt with exam and layout, answers
+                # (row storage only), questions, rank index stamp
+                self.assertEqual(large_count, 5 if packed else 6)
+
+                # answered and unanswered rows, with their option text
+                self.assertContains(large, 'Question 29')
+                self.assertContains(large, 'b0')
+                self.assertContains(large, 'a29')
+                self.assertContains(large, 'No answer', count=1)
+
+
+@override_settings(EXAM_ANALYTICS_DB='analytics')
+class AnalyticsReplicaTests(TransactionTestCase):
+    """A second SQLite file stands in for the replica, synced with sync_replica()."""
+
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        clear_process_caches()
+        create_fixture(self)
+        self.grade('ada_lovelace')
+        sync_replica()
+        self.grade('grace_hopper')  # only on the primary until the next sync
+        self.client.force_login(self.teacher)
+        self.url = reverse('view_submissions', args=[self.exam.id])
+
+    def grade(self, username):
+        return grade_submission(create_user(username), self.exam, {str(self.question.id): '2'})
+
+    def test_reports_read_from_the_replica(self):
+        with collect_metrics() as metrics:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'ada_lovelace')
+        self.assertNotContains(response, 'grace_hopper')
+        # the session and user come from the primary, the report from the replica
+        self.assertIn('analytics', metrics.by_alias())
+        self.assertIn('default', metrics.by_alias())
+
+        sync_replica()
+        self.assertContains(self.client.get(self.url), 'grace_hopper')
+
+    def test_exports_stream_from_the_replica(self):
+        response = self.client.get(reverse('export_submissions', args=[self.exam.id, 'attempts', 'csv']))
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('ada_lovelace', content)
+        self.assertNotIn('grace_hopper', content)
+
+    def test_write_pins_reads_to_the_primary(self):
+        response = self.client.post(reverse('regrade_exam', args=[self.exam.id]))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertContains(self.client.get(self.url), 'grace_hopper')
+
+    def test_other_views_and_writes_use_the_primary(self):
+        with collect_metrics() as metrics:
+            self.client.get(reverse('question_list', args=[self.exam.id]))
+        self.assertNotIn('analytics', metrics.by_alias())
+        self.assertEqual(StudentExamAttempt.objects.using('analytics').count(), 1)
+        self.assertEqual(StudentExamAttempt.objects.count(), 2)
+
+
+class ExamVersionTests(ExamTestCase):
+    """Exam.version only moves forward, so answer keys cached under an old version are never used again."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+
+    def test_saving_a_stale_exam_does_not_roll_the_version_back(self):
+        stale = Exam.objects.get(id=self.exam.id)
+        self.question.question_text = 'Question 0, edited'
+        self.question.save()
+        version = Exam.objects.get(id=self.exam.id).version
+
+        stale.title = 'Algebra II'
+        stale.save()
+        self.assertEqual(stale.version, version + 1)
+        self.exam.refresh_from_db()
+        self.assertEqual((self.exam.title, self.exam.version), ('Algebra II', version + 1))
+
+    def answer_key_after(self, change):
+        # what a process whose cache is never told about the change would use
+        get_answer_key(Exam.objects.get(id=self.exam.id))
+        with patch.object(answer_key_cache, 'invalidate'):
+            response = change()
+            self.assertEqual(response.status_code, 302)
+            return dict(get_answer_key(Exam.objects.get(id=self.exam.id)))
+
+    def test_question_views_move_the_answer_key_on(self):
+        fields = {
+            'question_text': 'Question', 'option1': 'a', 'option2': 'b', 'option3': 'c', 'option4': 'd',
+            'correct_option': 3, 'marks': 2,
+        }
+        key = self.answer_key_after(lambda: self.client.post(reverse('add_question', args=[self.exam.id]), fields))
+        added = Question.objects.latest('id')
+        self.assertEqual(key, {self.question.id: (self.question.correct_option, 1), added.id: (3, 2)})
+
+        key = self.answer_key_after(lambda: self.client.post(
+            reverse('edit_question', args=[added.id]), {**fields, 'correct_option': 4},
+        ))
+        self.assertEqual(key[added.id], (4, 2))
+
+        key = self.answer_key_after(lambda: self.client.post(reverse('delete_question', args=[added.id])))
+        self.assertEqual(key, {self.question.id: (self.question.correct_option, 1)})
+
+
+class GradingQueryTests(ExamTestCase):
+    """grade_submission writes an attempt with the same queries for any exam size."""
+
+    def setUp(self):
+        super().setUp()
+        # the student's first attempt also creates their per-student rows
+        grade_submission(self.student, self.exam, {})
+
+    def grading_queries(self, question_count):
+        exam, questions = create_exam(self.teacher, question_count, title=f'Exam {question_count}')
+        data = {str(q.id): '1' for q in questions}
+        get_answer_key(exam)  # the answer key is cached per process after the first load
+
+        with CaptureQueriesContext(connection) as queries:
+            attempt = grade_submission(self.student, exam, data)
+        self.assertEqual(StudentAnswer.objects.filter(attempt=attempt).count(), question_count)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_questions(self):
+        self.assertEqual(self.grading_queries(5), self.grading_queries(50))
+
+
+class RegradeTests(ExamTestCase):
+    """regrade_exam's vectorized scores match grading each attempt on its own."""
+
+    question_count = 6
+
+    def test_scores_match_per_attempt_grading(self):
+        students = [create_user(f'student{i}') for i in range(6)]
+        for i, student in enumerate(students):
+            # different answers per student, some questions left unanswered
+            data = {str(q.id): str(1 + (i + n) % 4) for n, q in enumerate(self.questions) if (i + n) % 5}
+            with self.settings(EXAM_PACKED_ANSWERS=i % 2 == 1):
+                grade_submission(student, self.exam, data)
+
+        changed = self.questions[1]
+        changed.correct_option = 1 + changed.correct_option % 4
+        changed.save()
+        self.questions[-1].delete()
+        self.exam.refresh_from_db()
+
+        report = regrade_exam(self.exam, chunk_size=2)
+        self.assertEqual(report['attempts'], 6)
+        self.assertGreater(report['changed'], 0)
+
+        answer_key = get_answer_key(self.exam)
+        attempts = StudentExamAttempt.objects.filter(exam=self.exam).select_related('answer_layout')
+        self.assertEqual({attempt.is_packed for attempt in attempts}, {False, True})
+        for attempt in attempts:
+            with self.subTest(attempt=attempt.id, packed=attempt.is_packed):
+                # packed attempts still hold the deleted question's answer
+                selections = {
+                    qid: option for qid, option in attempt.get_selections().items() if qid in answer_key
+                }
+                correct, earned, score = score_selections(answer_key, selections)
+                self.assertAlmostEqual(attempt.score, score)
+                self.assertEqual(attempt.correct_count, correct)
+                self.assertEqual(attempt.marks_earned, earned)
+                self.assertEqual(attempt.total_marks, answer_key.total_marks)
+                self.assertEqual(attempt.answered_count, len(selections))
+
+
+class BackfillMigrationTests(ExamTestCase):
+    """0016 fills the attempt mark columns chunk by chunk, same as grading would."""
+
+    question_count = 4
+
+    def test_backfill_matches_grading(self):
+        for marks, question in zip((1, 2, 3, 5), self.questions):
+            question.marks = marks
+            question.save()
+        graded = {}
+        for i in range(5):
+            # the last student answers nothing at all
+            data = {str(q.id): str(1 + (i + n) % 4) for n, q in enumerate(self.questions) if i < 4 and (i + n) % 3}
+            with self.settings(EXAM_PACKED_ANSWERS=False):
+                attempt = grade_submission(create_user(f'student{i}'), self.exam, data)
+            graded[attempt.id] = (attempt.answered_count, attempt.correct_count, attempt.marks_earned, attempt.total_marks)
+        StudentExamAttempt.objects.update(answered_count=0, correct_count=0, marks_earned=0, total_marks=0)
+
+        migration = importlib.import_module('exam.migrations.0016_backfill_attempt_marks')
+        with patch.object(migration, 'CHUNK_SIZE', 2):
+            migration.backfill_attempt_marks(django_apps, None)
+
+        backfilled = {
+            attempt_id: tuple(row) for attempt_id, *row in StudentExamAttempt.objects.values_list(
+                'id', 'answered_count', 'correct_count', 'marks_earned', 'total_marks',
+            )
+        }
+        self.assertEqual(backfilled, graded)
+        self.assertEqual(graded[max(graded)][:3], (0, 0, 0))
+        self.assertEqual({row[3] for row in graded.values()}, {11})
+
+
+class AdmissionTests(ExamTestCase):
+    def test_unknown_exam_gets_no_gate(self):
+        self.client.force_login(self.student)
+        missing = self.exam.id + 1000
+        for url in (reverse('attempt_exam', args=[missing]), reverse('submit_exam', args=[missing])):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(reverse('submit_exam', args=[missing])).status_code, 404)
+        self.assertNotIn(missing, admission_controller.stats())
+
+        gate = admission_controller.gate(self.exam.id)
+        admitted = gate.stats()['open']['admitted']
+        self.client.get(reverse('attempt_exam', args=[self.exam.id]))
+        self.assertEqual(gate.stats()['open']['admitted'], admitted + 1)
+
+
+class ItemAnalysisTests(ExamTestCase):
+    """The materialized item analysis matches a direct computation from the answers."""
+
+    question_count = 5
+
+    def setUp(self):
+        super().setUp()
+        self.random = random.Random(7)
+        self.students = 0
+
+    def add_attempts(self, count):
+        for _ in range(count):
+            self.students += 1
+            student = create_user(f'student{self.students}')
+            # most pick the right option, some skip a question
+            data = {}
+            for q in Question.objects.filter(exam=self.exam):
+                roll = self.random.random()
+                if roll < 0.6:
+                    data[str(q.id)] = str(q.correct_option)
+                elif roll < 0.9:
+                    data[str(q.id)] = str(self.random.randint(1, 4))
+            with self.settings(EXAM_PACKED_ANSWERS=self.students % 2 == 0):
+                grade_submission(student, self.exam, data)
+
+    def expected(self):
+        # (attempts x items) 0/1 matrix and option counts of every attempt
+        # against the current key
+        answer_key = get_answer_key(self.exam)
+        question_ids = sorted(answer_key)
+        attempts = StudentExamAttempt.objects.filter(exam=self.exam).select_related('answer_layout')
+        scored = np.zeros((len(attempts), len(question_ids)))
+        options = np.zeros((len(question_ids), 4))
+        for row, attempt in enumerate(attempts):
+            selections = attempt.get_selections()
+            for col, qid in enumerate(question_ids):
+                if qid in selections:
+                    scored[row, col] = selections[qid] == answer_key[qid][0]
+                    options[col, selections[qid] - 1] += 1
+
+        n, k = scored.shape
+        totals = scored.sum(axis=1)
+        p = scored.mean(axis=0)
+        discrimination = [np.corrcoef(scored[:, j], totals - scored[:, j])[0, 1] for j in range(k)]
+        kr20 = k / (k - 1) * (1 - (p * (1 - p)).sum() / totals.var())
+        return question_ids, p, discrimination, options / n, kr20
+
+    def assert_matches(self, analysis):
+        question_ids, p, discrimination, rates, kr20 = self.expected()
+        items = list(analysis.items.order_by('question_id'))
+        self.assertEqual([item.question_id for item in items], question_ids)
+        self.assertEqual(analysis.attempt_count, StudentExamAttempt.objects.filter(exam=self.exam).count())
+        self.assertAlmostEqual(analysis.kr20, kr20)
+        for i, item in enumerate(items):
+            with self.subTest(question=item.question_id):
+                self.assertAlmostEqual(item.p_value, p[i])
+                self.assertAlmostEqual(item.discrimination, discrimination[i])
+                counts = [item.option1_count, item.option2_count, item.option3_count, item.option4_count]
+                np.testing.assert_allclose(np.asarray(counts) / analysis.attempt_count, rates[i])
+
+    def test_matches_direct_computation(self):
+        self.add_attempts(12)
+        self.assert_matches(refresh_item_analysis(self.exam))
+
+    def test_refresh_only_reads_new_attempts(self):
+        self.add_attempts(8)
+        analysis = refresh_item_analysis(self.exam)
+        last_attempt_id = analysis.last_attempt_id
+        self.add_attempts(5)
+
+        with patch('exam.item_analysis.load_answers', wraps=load_answers) as load:
+            analysis = refresh_item_analysis(self.exam)
+        self.assertEqual(load.call_args.args[2], last_attempt_id)
+        self.assert_matches(analysis)
+
+    def test_rebuilds_after_key_changes(self):
+        self.add_attempts(10)
+        refresh_item_analysis(self.exam)
+
+        self.questions[-1].delete()
+        self.exam.refresh_from_db()
+        with patch('exam.item_analysis.load_answers', wraps=load_answers) as load:
+            analysis = refresh_item_analysis(self.exam)
+        self.assertEqual(load.call_args.args[2], 0)
+        self.assert_matches(analysis)
+
+        changed = self.questions[0]
+        changed.correct_option = 1 + changed.correct_option % 4
+        changed.save()
+        self.exam.refresh_from_db()
+        self.add_attempts(3)
+        self.assert_matches(refresh_item_analysis(self.exam))
+
+
+class RankIndexTests(TestCase):
+    def index(self, scores):
+        index = RankIndex()
+        for score in scores:
+            index.add(bucket_for(score))
+        return index
+
+    def test_tied_scores(self):
+        index = self.index([90, 75.5, 75.5, 75.5, 40, 0])
+        self.assertEqual(index.rank(90), (1, 5 / 6 * 100))
+        # ties share the best rank and are not better than each other
+        self.assertEqual(index.rank(75.5), (2, 2 / 6 * 100))
+        self.assertEqual(index.rank(40), (5, 1 / 6 * 100))
+        self.assertEqual(index.rank(0), (6, 0))
+
+        self.assertEqual([index.kth_best_score(k) for k in range(1, 7)], [90, 75.5, 75.5, 75.5, 40, 0])
+        self.assertIsNone(index.kth_best_score(0))
+        self.assertIsNone(index.kth_best_score(7))
+
+    def test_single_and_all_tied_attempts(self):
+        self.assertEqual(self.index([60]).rank(60), (1, 0))
+        index = self.index([100, 100, 100])
+        self.assertEqual(index.rank(100), (1, 0))
+        self.assertEqual(index.kth_best_score(3), 100)
+        self.assertEqual(RankIndex().rank(50), (1, None))
+
+    def test_result_page_of_the_only_attempt(self):
+        clear_process_caches()
+        student = create_user('student')
+        exam, questions = create_exam(question_count=2)
+        attempt = grade_submission(student, exam, {str(questions[0].id): str(questions[0].correct_option)})
+        self.client.force_login(student)
+        response = self.client.get(reverse('student_exam_result', args=[attempt.id]))
+        self.assertContains(response, 'Rank:</strong> 1 of 1')
+        self.assertContains(response, 'better than 0% of attempts')
+
+    def test_regrade_keeping_the_score_sum_rebuilds_the_index(self):
+        clear_process_caches()
+        exam, questions = create_exam(question_count=2, correct_option=1)
+        for name, option in (('top', '1'), ('bottom', '2')):
+            grade_submission(create_user(name), exam, {str(q.id): option for q in questions})
+        questions[1].correct_option = 2
+        questions[1].save()
+        self.assertEqual(get_rank_index(exam.id).kth_best_score(1), 100)
+        score_sum = ExamStats.objects.get(exam=exam).score_sum
+
+        # 100 + 0 becomes 50 + 50; another process' cache never sees the invalidate
+        with patch.object(rank_cache, 'invalidate'):
+            regrade_exam(exam)
+        self.assertEqual(ExamStats.objects.get(exam=exam).score_sum, score_sum)
+        index = get_rank_index(exam.id)
+        self.assertEqual([index.kth_best_score(k) for k in (1, 2)], [50, 50])
+
+
+class WriteLaneTests(TransactionTestCase):
+    """The lane thread uses its own connection, so these commit for real."""
+
+    def setUp(self):
+        clear_process_caches()
+        create_fixture(self)
+        self.answer_key = get_answer_key(self.exam)
+        self.lane = WriteLane()
+
+    def item(self, func, *args):
+        return Future(), func, args
+
+    def save(self, token=None):
+        return self.item(save_graded_attempt, self.student, self.exam, self.answer_key, {self.question.id: 1}, token)
+
+    def test_queued_writes_share_one_batch(self):
+        batch = [self.save() for _ in range(3)]
+        for item in batch:
+            self.lane._queue.put(item)
+        with patch.object(self.lane, 'write', wraps=self.lane.write) as write:
+            self.lane._start_thread()
+            attempts = [future.result(timeout=5) for future, _, _ in batch]
+        write.assert_called_once()
+        self.assertEqual(len(write.call_args.args[0]), 3)
+        self.assertEqual(StudentExamAttempt.objects.filter(id__in=[a.id for a in attempts]).count(), 3)
+
+    def test_duplicate_token_fails_only_that_write(self):
+        token = uuid.uuid4()
+        batch = [self.save(token), self.save(token), self.save()]
+        self.lane.write(batch)
+        self.assertEqual(batch[0][0].result().submission_token, token)
+        self.assertRaises(IntegrityError, batch[1][0].result)
+        self.assertIsNotNone(batch[2][0].result().id)
+        self.assertEqual(StudentExamAttempt.objects.count(), 2)
+
+    def test_failing_write_does_not_sink_the_batch(self):
+        def broken():
+            StudentExamAttempt.objects.create(student=self.student, exam=self.exam)
+            raise ValueError('bad submission')
+
+        batch = [self.save(), self.item(broken), self.save()]
+        self.lane.write(batch)
+        self.assertRaises(ValueError, batch[1][0].result)
+        kept = [batch[0][0].result().id, batch[2][0].result().id]
+        # the broken write's own row went with its savepoint
+        self.assertEqual(sorted(StudentExamAttempt.objects.values_list('id', flat=True)), kept)
+
+    def test_database_errors_fail_the_whole_batch(self):
+        def locked():
+            raise OperationalError('database is locked')
+
+        batch = [self.save(), self.item(locked)]
+        self.lane.write(batch)
+        for future, _, _ in batch:
+            self.assertRaises(OperationalError, future.result)
+        self.assertFalse(StudentExamAttempt.objects.exists())
+
+    def test_timed_out_write_is_cancelled(self):
+        calls = []
+        with self.settings(EXAM_WRITE_LANE_TIMEOUT=0.05), patch.object(self.lane, '_start_thread'):
+            with self.assertRaisesMessage(OperationalError, 'Timed out'):
+                self.lane.run(calls.append, 'late')
+        with self.settings(EXAM_WRITE_LANE_TIMEOUT=5):
+            self.assertIsNone(self.lane.run(calls.append, 'next'))
+        # the lane skipped the write its request gave up on
+        self.assertEqual(calls, ['next'])
+
+    def test_running_write_is_waited_for(self):
+        def slow():
+            time.sleep(1)
+            return 'done'
+
+        # the lane picks it up well within the timeout, then takes longer
+        with self.settings(EXAM_WRITE_LANE_TIMEOUT=0.5):
+            self.assertEqual(self.lane.run(slow), 'done')
+
+
+class QuestionImportTests(ExamTestCase):
+    header = ['question_text', 'option1', 'option2', 'option3', 'option4', 'correct_option', 'marks']
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+
+    def csv_file(self, rows, header=None, encoding='utf-8'):
+        text = io.StringIO()
+        writer = csv.writer(text)
+        for row in [header or self.header, *rows]:
+            writer.writerow(row)
+        return io.BytesIO(text.getvalue().encode(encoding))
+
+    def xlsx_file(self, rows, header=None):
+        workbook = Workbook()
+        for row in [header or self.header, *rows]:
+            workbook.active.append(row)
+        content = io.BytesIO()
+        workbook.save(content)
+        content.seek(0)
+        return content
+
+    def run_import(self, fileobj, name, **kwargs):
+        return import_questions(self.exam, read_question_rows(fileobj, name), **kwargs)
+
+    def files(self, rows, **kwargs):
+        return [('csv', self.csv_file(rows, **kwargs)), ('xlsx', self.xlsx_file(rows, **kwargs))]
+
+    def test_valid_file_bumps_version_and_counters(self):
+        rows = [['Q A', 'a', 'b', 'c', 'd', 2, 3], ['Q B', 'a', 'b', 'c', 'd', 4, '']]
+        for kind, fileobj in self.files(rows):
+            with self.subTest(kind=kind):
+                exam = Exam.objects.get(id=self.exam.id)
+                stats = ExamStats.objects.get(exam=exam)
+                report = self.run_import(fileobj, f'questions.{kind}')
+                self.assertEqual((report['imported'], report['invalid']), (2, 0))
+
+                added = Question.objects.filter(exam=exam).order_by('-id')[:2]
+                # a blank marks cell takes the model default
+                self.assertEqual([(q.question_text, q.correct_option, q.marks) for q in added], [('Q B', 4, 1), ('Q A', 2, 3)])
+                self.assertEqual(Exam.objects.get(id=exam.id).version, exam.version + 1)
+                new_stats = ExamStats.objects.get(exam=exam)
+                self.assertEqual(new_stats.question_count, stats.question_count + 2)
+                self.assertEqual(new_stats.total_marks, stats.total_marks + 4)
+
+    def test_invalid_row_imports_nothing(self):
+        rows = [['Q A', 'a', 'b', 'c', 'd', 1, 1], [], ['Q B', 'a', 'b', 'c', 'd', 7, 1], ['', 'a', 'b', 'c', 'd', 1, 'x']]
+        for kind, fileobj in self.files(rows):
+            with self.subTest(kind=kind):
+                version = Exam.objects.get(id=self.exam.id).version
+                report = self.run_import(fileobj, f'questions.{kind}', batch_size=1)
+                self.assertEqual((report['valid'], report['imported'], report['invalid']), (1, 0, 2))
+                # line numbers count the header and the blank line
+                self.assertEqual([row['line'] for row in report['errors']], [4, 5])
+                self.assertEqual(set(report['errors'][0]['errors']), {'correct_option'})
+                self.assertEqual(set(report['errors'][1]['errors']), {'question_text', 'marks'})
+                self.assertEqual(Question.objects.filter(exam=self.exam).count(), 1)
+                self.assertEqual(Exam.objects.get(id=self.exam.id).version, version)
+
+    def test_dry_run(self):
+        report = self.run_import(self.csv_file([['Q A', 'a', 'b', 'c', 'd', 1, 1]]), 'questions.csv', dry_run=True)
+        self.assertEqual((report['valid'], report['imported']), (1, 0))
+        self.assertEqual(Question.objects.filter(exam=self.exam).count(), 1)
+
+    def test_unreadable_files(self):
+        header = [name for name in self.header if name != 'option4']
+        for kind, fileobj in self.files([], header=header):
+            with self.subTest(kind=kind):
+                with self.assertRaisesMessage(ImportFileError, 'Missing column(s): option4'):
+                    self.run_import(fileobj, f'questions.{kind}')
+        latin1 = self.csv_file([['Qué', 'a', 'b', 'c', 'd', 1, 1]], encoding='latin-1')
+        with self.assertRaisesMessage(ImportFileError, 'not UTF-8'):
+            self.run_import(latin1, 'questions.csv')
+        with self.assertRaisesMessage(ImportFileError, 'not a valid .xlsx'):
+            self.run_import(io.BytesIO(b'not a workbook'), 'questions.xlsx')
+
+    def test_upload_page_reports_errors_then_imports_the_fixed_file(self):
+        url = reverse('import_questions', args=[self.exam.id])
+        rows = [['Q A', 'a', 'b', 'c', 'd', 1, 1], ['Q B', 'a', 'b', 'c', 'd', 9, 1]]
+        upload = SimpleUploadedFile('questions.csv', self.csv_file(rows).getvalue())
+        response = self.client.post(url, {'file': upload})
+        self.assertContains(response, 'nothing was imported')
+
+        rows[1][5] = 3
+        upload = SimpleUploadedFile('questions.csv', self.csv_file(rows).getvalue())
+        self.assertRedirects(self.client.post(url, {'file': upload}), reverse('question_list', args=[self.exam.id]))
+        self.assertEqual(Question.objects.filter(exam=self.exam, question_text='Q A').count(), 1)
+
+
+class ExportTests(ExamTestCase):
+    question_count = 4
+
+    def setUp(self):
+        super().setUp()
+        q1, q2, q3, q4 = self.questions
+        # id order interleaves storage modes, an attempt without answers
+        # and answers to a question that is deleted below
+        answers = [
+            (False, {q1: 2, q3: 4}),
+            (False, {}),
+            (True, {q2: 1, q4: 3}),
+            (False, {q4: 1, q1: 3}),
+            (True, {}),
+        ]
+        for i, (packed, selections) in enumerate(answers):
+            with self.settings(EXAM_PACKED_ANSWERS=packed):
+                grade_submission(create_user(f'student{i}'), self.exam, {str(q.id): str(o) for q, o in selections.items()})
+        q4.delete()
+        self.exam.refresh_from_db()
+        self.expected = [['2', '', '4'], ['', '', ''], ['', '1', ''], ['3', '', ''], ['', '', '']]
+        self.client.force_login(self.teacher)
+
+    def export(self, kind, fmt):
+        response = self.client.get(reverse('export_submissions', args=[self.exam.id, kind, fmt]))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_answer_matrix(self):
+        rows = list(answer_matrix_rows(self.exam))
+        q1, q2, q3, _ = self.questions
+        self.assertEqual(rows[0][4:], [f'Q1 (#{q1.id})', f'Q2 (#{q2.id})', f'Q3 (#{q3.id})'])
+        self.assertEqual(rows[1][4:], [q1.correct_option, q2.correct_option, q3.correct_option])
+        attempts = list(StudentExamAttempt.objects.filter(exam=self.exam).order_by('id'))
+        self.assertEqual([row[:2] for row in rows[2:]], [[a.id, a.student_username] for a in attempts])
+        self.assertEqual([[str(cell) for cell in row[4:]] for row in rows[2:]], self.expected)
+
+    def test_csv(self):
+        lines = list(csv.reader(io.StringIO(self.export('answers', 'csv').decode())))
+        self.assertEqual([line[4:] for line in lines[2:]], self.expected)
+        attempts = list(csv.reader(io.StringIO(self.export('attempts', 'csv').decode())))
+        self.assertEqual(attempts[0][:2], ['attempt_id', 'student'])
+        self.assertEqual(len(attempts), 6)
+
+    def test_xlsx(self):
+        sheet = load_workbook(io.BytesIO(self.export('answers', 'xlsx')), read_only=True).active
+        rows = [['' if cell is None else str(cell) for cell in row] for row in sheet.iter_rows(values_only=True)]
+        self.assertEqual(sheet.title, 'Answers')
+        self.assertEqual([row[4:] for row in rows[2:]], self.expected)
+
+        sheet = load_workbook(io.BytesIO(self.export('attempts', 'xlsx')), read_only=True).active
+        rows = list(sheet.iter_rows(values_only=True))
+        first = StudentExamAttempt.objects.filter(exam=self.exam).order_by('id').first()
+        self.assertEqual(rows[1][:2], (first.id, first.student_username))
+        # Excel gets local time without a zone, to the millisecond
+        local = timezone.localtime(first.submitted_at).replace(tzinfo=None)
+        self.assertAlmostEqual(rows[1][2], local, delta=datetime.timedelta(milliseconds=1))
+
+
+class RollupTests(ExamTestCase):
+    """The signal-maintained rollups always equal a rebuild from scratch."""
+
+    question_count = 3
+
+    def setUp(self):
+        super().setUp()
+        self.other_exam, _ = create_exam(self.teacher, 2, title='Geometry')
+        self.students = [self.student, create_user('second'), create_user('third')]
+        for i, student in enumerate(self.students):
+            for exam in (self.exam, self.other_exam):
+                for n in range(i + 1):
+                    data = {str(q.id): str(1 + (i + n) % 4) for q in exam.questions.all()}
+                    grade_submission(student, exam, data)
+
+    def snapshot(self):
+        exams = list(ExamStats.objects.order_by('exam_id').values_list(
+            'exam_id', 'submission_count', 'question_count', 'total_marks', 'score_sum',
+        ))
+        buckets = list(ScoreBucket.objects.filter(count__gt=0).order_by('exam_id', 'bucket').values_list('exam_id', 'bucket', 'count'))
+        students = list(StudentStats.objects.filter(attempt_count__gt=0).order_by('student_id').values_list(
+            'student_id', 'attempt_count', 'score_sum', 'best_score', 'latest_score', 'latest_submitted_at',
+        ))
+        bests = list(StudentExamBest.objects.order_by('student_id', 'exam_id').values_list(
+            'student_id', 'exam_id', 'best_score', 'attempt_count',
+        ))
+        return exams, buckets, students, bests
+
+    def assert_matches_rebuild(self):
+        incremental = self.snapshot()
+        rebuild_exam_stats()
+        rebuild_student_stats()
+        for kept, rebuilt in zip(incremental, self.snapshot()):
+            self.assertEqual(len(kept), len(rebuilt))
+            for kept_row, rebuilt_row in zip(kept, rebuilt):
+                # float sums may differ in the last bits
+                self.assertEqual(len(kept_row), len(rebuilt_row))
+                for a, b in zip(kept_row, rebuilt_row):
+                    if isinstance(a, float):
+                        self.assertAlmostEqual(a, b)
+                    else:
+                        self.assertEqual(a, b)
+
+    def test_attempts_added(self):
+        self.assertEqual(ExamStats.objects.get(exam=self.exam).submission_count, 6)
+        self.assert_matches_rebuild()
+
+    def test_attempt_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            # the only attempt of the first student at this exam, then the latest of another
+            StudentExamAttempt.objects.filter(exam=self.exam, student=self.student).delete()
+            StudentExamAttempt.objects.filter(student=self.students[2]).latest('id').delete()
+        self.assertFalse(StudentExamBest.objects.filter(student=self.student, exam=self.exam).exists())
+        self.assert_matches_rebuild()
+
+    def test_exam_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_exam.delete()
+        self.assertFalse(ExamStats.objects.filter(exam_id=self.other_exam.id).exists())
+        self.assert_matches_rebuild()
+
+    def test_questions_added_and_deleted(self):
+        Question.objects.create(
+            exam=self.exam, question_text='Extra', option1='a', option2='b', option3='c', option4='d',
+            correct_option=1, marks=5,
+        )
+        self.questions[0].delete()
+        stats = ExamStats.objects.get(exam=self.exam)
+        self.assertEqual((stats.question_count, stats.total_marks), (3, 7))
+        self.assert_matches_rebuild()
+
+    def test_regrade(self):
+        question = self.questions[0]
+        question.correct_option = 1 + question.correct_option % 4
+        question.save()
+        self.exam.refresh_from_db()
+        self.assertGreater(regrade_exam(self.exam)['changed'], 0)
+        self.assert_matches_rebuild()
+
+
+class StudentHistoryTests(ExamTestCase):
+    def test_pages_cover_every_attempt_once(self):
+        for _ in range(45):
+            StudentExamAttempt.objects.create(student=self.student, exam=self.exam)
+        # ties on submitted_at are broken by id
+        StudentExamAttempt.objects.filter(id__in=StudentExamAttempt.objects.order_by('id')[10:30].values('id')).update(
+            submitted_at=timezone.now() - datetime.timedelta(days=1),
+        )
+        expected = list(StudentExamAttempt.objects.order_by('-submitted_at', '-id').values_list('id', flat=True))
+
+        self.client.force_login(self.student)
+        url = reverse('student_exam_history')
+        seen, sizes, params = [], [], {}
+        for _ in range(5):
+            response = self.client.get(url, params)
+            self.assertEqual(response.context['is_first_page'], not params)
+            page = [attempt.id for attempt in response.context['attempts']]
+            seen += page
+            sizes.append(len(page))
+            if response.context['next_cursor'] is None:
+                break
+            params = {'after': response.context['next_cursor']}
+        self.assertEqual(sizes, [20, 20, 5])
+        self.assertEqual(seen, expected)
+
+        # a malformed cursor starts over
+        response = self.client.get(url + '?after=garbage')
+        self.assertEqual([attempt.id for attempt in response.context['attempts']], expected[:20])
+
+
+class ExamPaperTests(ExamTestCase):
+    question_count = 5
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+        self.url = reverse('attempt_exam', args=[self.exam.id])
+
+    def counters(self):
+        stats = paper_cache.stats()
+        return stats['hits'], stats['misses']
+
+    def test_paper_is_rendered_once_per_version(self):
+        hits, misses = self.counters()
+        self.assertContains(self.client.get(self.url), 'Question 4')
+        self.assertEqual(self.counters(), (hits, misses + 1))
+        self.client.get(self.url)
+        self.assertEqual(self.counters(), (hits + 1, misses + 1))
+
+        question = self.questions[4]
+        question.question_text = 'Question 4, edited'
+        question.save()
+        self.assertContains(self.client.get(self.url), 'Question 4, edited')
+        self.assertEqual(self.counters(), (hits + 1, misses + 2))
+
+    @override_settings(EXAM_SECTION_SIZE=2)
+    def test_sections(self):
+        page = self.client.get(self.url)
+        self.assertEqual(list(page.context['sections']), [1, 2, 3])
+        # only the first section comes with the page
+        self.assertContains(page, 'Question 1')
+        self.assertNotContains(page, 'Question 2')
+
+        texts = []
+        for section in (1, 2, 3):
+            response = self.client.get(reverse('exam_section', args=[self.exam.id, section]))
+            texts.append([q.question_text for q in self.questions if q.question_text in response.content.decode()])
+        self.assertEqual(texts, [['Question 0', 'Question 1'], ['Question 2', 'Question 3'], ['Question 4']])
+        for section in (0, 4):
+            with self.subTest(section=section):
+                self.assertEqual(self.client.get(reverse('exam_section', args=[self.exam.id, section])).status_code, 404)
+
+    @override_settings(EXAM_SECTION_SIZE=2)
+    def test_submit_takes_answers_from_unloaded_sections(self):
+        # the page sends answers of sections it never opened as hidden inputs
+        data = {'submission_token': self.client.get(self.url).context['submission_token']}
+        data.update({str(q.id): str(q.correct_option) for q in self.questions[3:]})
+        self.client.post(reverse('submit_exam', args=[self.exam.id]), data)
+        attempt = StudentExamAttempt.objects.get(student=self.student)
+        self.assertEqual(attempt.get_selections(), {q.id: q.correct_option for q in self.questions[3:]})
+        self.assertEqual(attempt.correct_count, 2)
+
+
+class PackedAnswerTests(ExamTestCase):
+    question_count = 5
+
+    def test_round_trip(self):
+        for count in (1, 3, 5, 7):
+            question_ids = [100 + 7 * i for i in range(count)]
+            for skip in (0, 2):
+                with self.subTest(count=count, skip=skip):
+                    # every option appears, every other question (or none) is left out
+                    selections = {
+                        qid: 1 + i % 4 for i, qid in enumerate(question_ids) if not skip or i % skip
+                    }
+                    packed = pack_selections(question_ids, selections)
+                    self.assertEqual(len(packed), (count + 1) // 2)
+                    self.assertEqual(unpack_selections(question_ids, packed), selections)
+        self.assertEqual(unpack_selections([1, 2, 3], None), {})
+        # a blob shorter than the layout leaves the rest unanswered
+        self.assertEqual(unpack_selections([1, 2, 3], pack_selections([1, 2], {1: 4, 2: 2})), {1: 4, 2: 2})
+
+    def test_teacher_sees_the_same_answers_in_both_modes(self):
+        data = {str(self.questions[0].id): '3', str(self.questions[3].id): '1', str(self.questions[4].id): '4'}
+        attempts = []
+        for packed in (False, True):
+            with self.settings(EXAM_PACKED_ANSWERS=packed):
+                attempts.append(grade_submission(create_user(f'packed{packed}'), self.exam, data))
+        rows, packed_attempt = attempts
+        self.assertTrue(packed_attempt.is_packed)
+
+        def answers(attempt):
+            return [
+                (answer.question.question_text, answer.selected_option, answer.get_selected_option_display())
+                for answer in StudentExamAttempt.objects.get(id=attempt.id).get_answers()
+            ]
+        self.assertEqual(answers(packed_attempt), answers(rows))
+        self.assertEqual(answers(packed_attempt)[0], ('Question 0', 3, 'Option 3'))
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('view_student_answers', args=[packed_attempt.id]))
+        self.assertContains(response, 'Question 3')
+        self.assertContains(response, 'Option 4')
+        self.assertNotContains(response, 'Question 1<')
+
+
+class StaticAssetTests(SimpleTestCase):
+    """collectstatic into a temporary STATIC_ROOT, served through static_asset."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        source = os.path.join(cls.tmp.name, 'source')
+        os.makedirs(source)
+        with open(os.path.join(source, 'app.css'), 'w') as f:
+            f.write('body { color: #333; }\n' * 50)
+        with open(os.path.join(source, 'tiny.css'), 'w') as f:
+            f.write('p {}\n')
+        cls.root = os.path.join(cls.tmp.name, 'root')
+        settings = override_settings(STATIC_ROOT=cls.root, STATICFILES_DIRS=[source])
+        settings.enable()
+        cls.addClassCleanup(settings.disable)
+        cls.addClassCleanup(cls.tmp.cleanup)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed = staticfiles_storage.stored_name('app.css')
+
+    def get(self, path, accept_encoding=''):
+        request = RequestFactory().get('/static/' + path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        return static_asset(request, path)
+
+    def test_collectstatic_writes_compressed_copies(self):
+        self.assertRegex(self.hashed, r'^app\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, self.hashed), 'rb') as f, gzip.open(os.path.join(self.root, self.hashed + '.gz')) as gz:
+            self.assertEqual(gz.read(), f.read())
+        # too small to be worth it
+        self.assertFalse(os.path.exists(os.path.join(self.root, staticfiles_storage.stored_name('tiny.css') + '.gz')))
+
+    def test_pick_encoding(self):
+        with open(os.path.join(self.root, self.hashed + '.br'), 'wb') as f:
+            f.write(b'brotli stand-in')
+        self.addCleanup(os.remove, os.path.join(self.root, self.hashed + '.br'))
+        for accept, expected in (
+            ('gzip, deflate, br', (self.hashed + '.br', 'br')),
+            ('gzip;q=1.0, identity', (self.hashed + '.gz', 'gzip')),
+            ('', (self.hashed, None)),
+            ('deflate', (self.hashed, None)),
+        ):
+            with self.subTest(accept=accept):
+                self.assertEqual(pick_encoding(self.root, self.hashed, accept), expected)
+        self.assertEqual(pick_encoding(self.root, 'tiny.css', 'gzip, br'), ('tiny.css', None))
+
+    def test_serves_the_compressed_variant(self):
+        response = self.get(self.hashed, 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        with open(os.path.join(self.root, self.hashed + '.gz'), 'rb') as f:
+            self.assertEqual(b''.join(response.streaming_content), f.read())
+
+        plain = self.get(self.hashed)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+    def test_only_hashed_names_are_immutable(self):
+        self.assertIn('immutable', self.get(self.hashed)['Cache-Control'])
+        cache_control = self.get('app.css')['Cache-Control']
+        self.assertNotIn('immutable', cache_control)
+        self.assertIn('max-age=300', cache_control)
+
+    def test_compressed_files_are_not_served_directly(self):
+        for suffix in ('.gz', '.br'):
+            with self.subTest(suffix=suffix), self.assertRaises(Http404):
+                self.get(self.hashed + suffix)
+
+
+class SubmissionQueueTests(ExamTestCase):
+    def enqueue(self, student, token=None):
+        return enqueue_submission(student, self.exam, {str(self.question.id): '1'}, token)
+
+    def test_deleted_student_does_not_sink_the_batch(self):
+        other = create_user('other')
+        kept = self.enqueue(self.student)
+        self.enqueue(other)
+        items = claim_batch('worker', 10)
+        other.delete()
+
+        self.assertEqual(process_batch(items), 1)
+        kept.refresh_from_db()
+        self.assertEqual(kept.status, QueuedSubmission.DONE)
+        self.assertIsNotNone(kept.attempt_id)
+        self.assertFalse(QueuedSubmission.objects.filter(status=QueuedSubmission.PROCESSING).exists())
+
+    def test_token_already_graded_points_at_that_attempt(self):
+        token = uuid.uuid4()
+        attempt = grade_submission(self.student, self.exam, {str(self.question.id): '1'}, token)
+        item = self.enqueue(self.student, token)
+
+        process_batch(claim_batch('worker', 10))
+        item.refresh_from_db()
+        self.assertEqual(item.status, QueuedSubmission.DONE)
+        self.assertEqual(item.attempt_id, attempt.id)
+        self.assertEqual(StudentExamAttempt.objects.count(), 1)
+
+
+class SubmissionTokenTests(ExamTestCase):
+    def test_replayed_token_redirects_to_the_first_attempt(self):
+        self.client.force_login(self.student)
+        url = reverse('submit_exam', args=[self.exam.id])
+        data = {
+            'submission_token': issue_submission_token(self.student, self.exam),
+            str(self.question.id): '1',
+        }
+
+        first = self.client.post(url, data)
+        attempt = StudentExamAttempt.objects.get()
+        self.assertRedirects(first, reverse('student_exam_result', args=[attempt.id]), fetch_redirect_response=False)
+
+        # a double click or browser retry, this time with a different answer
+        replay = self.client.post(url, {**data, str(self.question.id): '2'})
+        self.assertRedirects(replay, reverse('student_exam_result', args=[attempt.id]), fetch_redirect_response=False)
+        self.assertEqual(StudentExamAttempt.objects.count(), 1)
+        self.assertEqual(StudentAnswer.objects.count(), 1)
+        self.assertEqual(StudentAnswer.objects.get().selected_option, 1)
+
+
+class DraftBufferTests(ExamTestCase):
+    def test_answers_stay_readable_while_a_flush_is_writing(self):
+        buffer = DraftBuffer()
+        seen = {}
+
+        def slow_write(pending):
+            # what a submit would read while this flush has not committed yet
+            seen.update(buffer.pending_for(self.student.id, self.exam.id))
+            write_drafts(pending)
+
+        with self.settings(EXAM_DRAFT_FLUSH_INTERVAL=60), patch('exam.drafts.write_drafts', slow_write):
+            buffer.add(self.student.id, self.exam.id, None, {self.question.id: 3})
+            buffer.flush()
+        self.assertEqual(seen, {None: {self.question.id: 3}})
+        self.assertEqual(buffer.pending_for(self.student.id, self.exam.id), {})
+
+    def test_failed_flush_keeps_the_answers(self):
+        buffer = DraftBuffer()
+        with self.settings(EXAM_DRAFT_FLUSH_INTERVAL=60), patch('exam.drafts.write_drafts', side_effect=OperationalError):
+            buffer.add(self.student.id, self.exam.id, None, {self.question.id: 2})
+            with self.assertRaises(OperationalError):
+                buffer.flush()
+        self.assertEqual(buffer.pending_for(self.student.id, self.exam.id), {None: {self.question.id: 2}})
+
+
+class StaleDraftTests(ExamTestCase):
+    """A draft saved for an attempt that was submitted never reaches the next attempt."""
+
+    question_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+
+    def open_attempt(self):
+        response = self.client.get(reverse('attempt_exam', args=[self.exam.id]))
+        return response.context['submission_token'], response.context['draft_answers']
+
+    def save_draft(self, signed_token, answers):
+        return self.client.post(
+            reverse('save_answer_draft', args=[self.exam.id]),
+            {'answers': answers, 'submission_token': signed_token},
+            content_type='application/json',
+        )
+
+    def test_late_flush_after_submit_is_ignored(self):
+        first, second = self.questions
+        signed_token, _ = self.open_attempt()
+        with self.settings(EXAM_DRAFT_FLUSH_INTERVAL=0):
+            self.assertEqual(self.save_draft(signed_token, {str(first.id): '2'}).status_code, 200)
+        self.client.post(reverse('submit_exam', args=[self.exam.id]), {
+            'submission_token': signed_token, str(first.id): '2', str(second.id): '1',
+        })
+
+        # a flush from another process, or one already in flight, lands after the submit
+        token = read_submission_token(signed_token, self.student, self.exam)
+        write_drafts({(self.student.id, self.exam.id, token): {second.id: 3}})
+        self.assertEqual(load_draft(self.student, self.exam), {})
+
+        # the retake starts empty and only answers the first question
+        signed_token, draft_answers = self.open_attempt()
+        self.assertEqual(draft_answers, {})
+        self.client.post(reverse('submit_exam', args=[self.exam.id]), {
+            'submission_token': signed_token, str(first.id): '4',
+        })
+        retake = StudentExamAttempt.objects.latest('id')
+        self.assertEqual(retake.get_selections(), {first.id: 4})
+
+        # the retake's own drafts start over instead of merging into the stale row
+        with self.settings(EXAM_DRAFT_FLUSH_INTERVAL=0):
+            signed_token, _ = self.open_attempt()
+            self.save_draft(signed_token, {str(first.id): '1'})
+        self.assertEqual(load_draft(self.student, self.exam), {first.id: 1})
+
+    def test_draft_needs_the_pages_token(self):
+        other_exam, _ = create_exam(title='Other')
+        other_token = issue_submission_token(self.student, other_exam)
+        for token in ('', 'forged', other_token):
+            with self.subTest(token=token):
+                self.assertEqual(self.save_draft(token, {str(self.question.id): '1'}).status_code, 400)
@@ -1,13 +1,45 @@
+import json
+
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Exam, StudentAnswer, StudentExamAttempt, StudentProfile, TeacherProfile
+from .models import (
+    Exam, ExamStats, QueuedSubmission, StudentExamAttempt, StudentExamBest, StudentProfile, StudentStats,
+    TeacherProfile,
+)
 from .forms import ExamForm, StudentProfileForm, TeacherProfileForm
+from .admission import admission_controlled, admission_controller
+from .answer_keys import answer_key_cache, get_answer_key
+from .conditional import conditional_page
+from .db_router import analytics_reads
+from .drafts import discard_draft, load_draft, save_draft
+from .exports import answer_matrix_rows, attempt_rows, stream_csv, stream_xlsx
+from .exam_papers import get_exam_paper, paper_cache, section_count
+from .grading import grade_submission, issue_submission_token, parse_selections, read_submission_token
+from .item_analysis import item_report, refresh_item_analysis
+from .pagination import filter_page, keyset_page
+from .query_metrics import metrics_store, query_budget
+from .question_import import ImportFileError, QUESTION_COLUMNS, import_questions, read_question_rows
+from .ranking import get_rank_index, rank_cache
+from .regrade import regrade_exam
+from .static_assets import IMMUTABLE_MAX_AGE, pick_encoding
+from .submission_queue import enqueue_submission, queued_grading_enabled
 from accounts.views import admin_required  # import your decorator
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test,login_required
+from django.db import IntegrityError
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.static import serve
 
 
 # Create your views here.
 
+HISTORY_PAGE_SIZE = 20
+LEADERBOARD_SIZE = 20
+SUBMISSIONS_PAGE_SIZE = 50
+SUBMISSION_SORTS = ['-submitted_at', 'submitted_at', '-score', 'score', 'student_username', '-student_username']
+
 # helpers for role check
 def is_admin(user):
     return user.is_authenticated and user.role == 'admin'
@@ -20,6 +52,8 @@ def is_admin_or_teacher(user):
 
 
 @user_passes_test(is_admin_or_teacher)
+@conditional_page(lambda request: ['exams'])
+@query_budget(4)
 def exam_list(request):
     if request.user.role == 'teacher':
         exams = Exam.objects.filter(created_by=request.user)
@@ -99,6 +133,8 @@ def teacher_exam_dashboard(request):
 
 
 @user_passes_test(is_admin_or_teacher)
+@conditional_page(lambda request, exam_id: ['exams', f'exam:{exam_id}'])
+@query_budget(6)
 def question_list(request, exam_id):
     exam = get_object_or_404(Exam, id=exam_id)
 
@@ -128,6 +164,35 @@ def add_question(request, exam_id):
         form = QuestionForm()
     return render(request, 'exam/add_question.html', {'form': form, 'exam': exam})
 
+@user_passes_test(is_admin_or_teacher)
+def import_questions_view(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+
+    if request.user.role == 'teacher' and exam.created_by != request.user:
+        return redirect('exam_list')
+
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, 'Choose a .csv or .xlsx file to import.')
+        else:
+            try:
+                report = import_questions(
+                    exam, read_question_rows(upload.file, upload.name), dry_run=bool(request.POST.get('dry_run')),
+                )
+            except ImportFileError as e:
+                messages.error(request, str(e))
+            else:
+                if report['imported']:
+                    messages.success(request, f"Imported {report['imported']} questions.")
+                    return redirect('question_list', exam_id=exam.id)
+    return render(request, 'exam/import_questions.html', {
+        'exam': exam,
+        'report': report,
+        'columns': QUESTION_COLUMNS,
+    })
+
 @user_passes_test(is_admin_or_teacher)
 def edit_question(request, question_id):
     question = get_object_or_404(Question, id=question_id)
@@ -157,78 +222,157 @@ def delete_question(request, question_id):
 
 
 @login_required
+@conditional_page(lambda request: ['exams'])
+@query_budget(4)
 def student_exam_list(request):
     exams = Exam.objects.all()  
     return render(request, 'student/student_exam_list.html', {'exams': exams})
 
 
 @login_required
+@admission_controlled
 def attempt_exam(request, exam_id):
     exam = get_object_or_404(Exam, id=exam_id)
-    questions = exam.questions.all()  # Assuming related_name='questions' in Question model
 
-    total_marks = sum(question.marks for question in questions)
-    
+    # The question list is rendered once per exam version and cached, only
+    # the tokens, timer and saved answers are filled in per request.
+    # Large exams are sent one section at a time, the rest is fetched from
+    # exam_section when the student opens it.
+    answer_key = get_answer_key(exam)
+    sections = section_count(answer_key)
+    exam_paper = get_exam_paper(exam, answer_key, section=1 if sections else None)
+    total_marks = answer_key.total_marks
 
     return render(request, 'exam/attempt_exam.html', {
         'exam': exam,
-        'questions': questions,
+        'exam_paper': exam_paper,
+        'sections': range(1, sections + 1),
         'total_marks': total_marks,
+        'submission_token': issue_submission_token(request.user, exam),
+        'draft_answers': {str(qid): option for qid, option in load_draft(request.user, exam).items()},
         'duration_minutes': exam.duration_minutes,  # Passed for dynamic timer
     })
 
 
 @login_required
+def exam_section(request, exam_id, section):
+    exam = get_object_or_404(Exam, id=exam_id)
+    answer_key = get_answer_key(exam)
+    if not 1 <= section <= section_count(answer_key):
+        raise Http404('No such section')
+    return HttpResponse(get_exam_paper(exam, answer_key, section=section))
+
+
+@login_required
+@admission_controlled
 def submit_exam(request, exam_id):
     if request.method == 'POST':
         exam = get_object_or_404(Exam, id=exam_id)
         student = request.user
 
-        attempt = StudentExamAttempt.objects.create(student=student, exam=exam)
+        token = read_submission_token(request.POST.get('submission_token'), student, exam)
+        if token is None:
+            messages.error(request, 'Your exam session is no longer valid. Please start the exam again.')
+            return redirect('exam_instructions', exam_id=exam.id)
+
+        # A replayed token (double click, timer + manual submit, browser retry)
+        # goes straight to the result of the first submission
+        replay = find_submitted(token)
+        if replay:
+            return replay
+
+        # The page posts every answer, including ones in sections it never
+        # loaded, so the autosaved draft is not merged in: a late flush of an
+        # earlier attempt's draft must not end up in this one
+        data = request.POST
+
+        try:
+            if queued_grading_enabled():
+                submission = enqueue_submission(student, exam, data, token)
+                discard_draft(student, exam)
+                return redirect('submission_status', submission_id=submission.id)
+
+            attempt = grade_submission(student, exam, data, token)
+        except IntegrityError:
+            # another process stored this token first
+            return find_submitted(token) or redirect('student_exam_list')
+
+        discard_draft(student, exam)
+        return redirect('student_exam_result', attempt_id=attempt.id)
+    else:
+        return redirect('student_exam_list')
 
-        total_correct = 0
-        total_questions = exam.questions.count()
 
-        for question in exam.questions.all():
-            selected_option = request.POST.get(str(question.id))
-            if selected_option:
-                selected_option = int(selected_option)
-                StudentAnswer.objects.create(
-                    attempt=attempt,
-                    question=question,
-                    selected_option=selected_option
-                )
-                if selected_option == question.correct_option:
-                    total_correct += 1
+@login_required
+def save_answer_draft(request, exam_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    exam = get_object_or_404(Exam, id=exam_id)
+    try:
+        body = json.loads(request.body)
+        answers = body.get('answers', {})
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(answers, dict):
+        return JsonResponse({'error': 'Invalid answers'}, status=400)
+    # drafts are kept per attempt page, identified by its submission token
+    token = read_submission_token(body.get('submission_token'), request.user, exam)
+    if token is None:
+        return JsonResponse({'error': 'Invalid submission token'}, status=400)
+
+    deltas = parse_selections(answers, get_answer_key(exam))
+    if deltas:
+        save_draft(request.user, exam, token, deltas)
+    return JsonResponse({'saved': len(deltas)})
+
+
+def find_submitted(token):
+    attempt_id = StudentExamAttempt.objects.filter(submission_token=token).values_list('id', flat=True).first()
+    if attempt_id:
+        return redirect('student_exam_result', attempt_id=attempt_id)
+    submission_id = QueuedSubmission.objects.filter(submission_token=token).values_list('id', flat=True).first()
+    if submission_id:
+        return redirect('submission_status', submission_id=submission_id)
+    return None
 
-        # Calculate score as percentage
-        score = (total_correct / total_questions) * 100 if total_questions > 0 else 0
-        attempt.score = score
-        attempt.save()
 
-        return redirect('student_exam_result', attempt_id=attempt.id)
-    else:
+@login_required
+def submission_status(request, submission_id):
+    submission = get_object_or_404(QueuedSubmission, id=submission_id, student=request.user)
+
+    if submission.attempt_id:
+        return redirect('student_exam_result', attempt_id=submission.attempt_id)
+    if submission.status == QueuedSubmission.FAILED:
+        messages.error(request, 'Your submission could not be graded. Please contact your teacher.')
         return redirect('student_exam_list')
 
+    # Still queued, the page refreshes itself until the score is ready
+    return render(request, 'student/grading_pending.html', {'submission': submission})
+
 #update
 @login_required
+@query_budget(6)
 def student_exam_result(request, attempt_id):
-    attempt = get_object_or_404(StudentExamAttempt, id=attempt_id, student=request.user)
-    answers = attempt.answers.all()
-
-    # Calculate total marks possible for the exam
-    total_marks = sum(question.marks for question in attempt.exam.questions.all())
+    attempt = get_object_or_404(
+        StudentExamAttempt.objects.select_related('exam', 'student', 'answer_layout'),
+        id=attempt_id, student=request.user,
+    )
+    # every question with its answer text worked out here, so the template
+    # never touches the database
+    answers = attempt.get_answer_sheet()
 
-    # Calculate total marks earned from correct answers
-    marks_earned = 0
-    for ans in answers:
-        if ans.selected_option == ans.question.correct_option:
-            marks_earned += ans.question.marks
+    # Marks are stored on the attempt when it is graded
+    total_marks = attempt.total_marks
+    marks_earned = attempt.marks_earned
 
     # Calculate percentage score (optional, you already have attempt.score)
     rounded_score = int(round(attempt.score))
     progress_width = f"width: {rounded_score}%;"
 
+    rank_index = get_rank_index(attempt.exam_id)
+    rank, percentile = rank_index.rank(attempt.score)
+
     return render(request, 'student/student_exam_result.html', {
         'attempt': attempt,
         'answers': answers,
@@ -236,13 +380,25 @@ def student_exam_result(request, attempt_id):
         'marks_earned': marks_earned,
         'rounded_score': rounded_score,
         'progress_width': progress_width,
+        'rank': rank,
+        'rank_total': rank_index.total,
+        'percentile': percentile,
     })
 
 
 @login_required
+@query_budget(3)
 def student_exam_history(request):
-    attempts = StudentExamAttempt.objects.filter(student=request.user).order_by('-submitted_at')
-    return render(request, 'student/student_exam_history.html', {'attempts': attempts})
+    cursor = request.GET.get('after')
+    attempts, next_cursor = keyset_page(
+        StudentExamAttempt.objects.filter(student=request.user).select_related('exam'),
+        '-submitted_at', cursor, size=HISTORY_PAGE_SIZE,
+    )
+    return render(request, 'student/student_exam_history.html', {
+        'attempts': attempts,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
+    })
 
 @login_required
 def delete_student_exam_attempt(request, attempt_id):
@@ -259,21 +415,25 @@ def delete_student_exam_attempt(request, attempt_id):
 
 
 @login_required
+@query_budget(6)
 def student_profile(request):
     student = request.user
-    attempts = StudentExamAttempt.objects.filter(student=student)
-    total_attempts = attempts.count()
-    
-    if total_attempts > 0:
-        average_score = sum(a.score for a in attempts) / total_attempts
-    else:
-        average_score = 0
+    # rollup maintained at grading time, see exam/exam_stats.py
+    stats = StudentStats.objects.filter(student=student).first() or StudentStats(student=student)
+
+    # only the latest few are shown on the profile
+    attempts, _ = keyset_page(
+        StudentExamAttempt.objects.filter(student=student).select_related('exam'), '-submitted_at', size=5,
+    )
+    exam_bests = StudentExamBest.objects.filter(student=student).select_related('exam').order_by('exam__title')
 
     return render(request, 'student/student_profile.html', {
         'student': student,
         'attempts': attempts,
-        'total_attempts': total_attempts,
-        'average_score': round(average_score, 2),
+        'stats': stats,
+        'exam_bests': exam_bests,
+        'total_attempts': stats.attempt_count,
+        'average_score': round(stats.mean_score or 0, 2),
     })
 
 @login_required
@@ -312,6 +472,8 @@ def student_dashboard(request):
 
 
 @login_required
+@conditional_page(lambda request, exam_id: ['exams', f'exam:{exam_id}', f'attempts:{request.user.id}'])
+@query_budget(5)
 def exam_instructions_view(request, exam_id):
     exam = get_object_or_404(Exam, id=exam_id)
 
@@ -332,11 +494,12 @@ def exam_instructions_view(request, exam_id):
 #teacher dashboard
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Count
 from .models import Exam, TeacherProfile
 
 
 @login_required
+@analytics_reads
+@query_budget(4)
 def teacher_dashboard(request):
     if request.user.role != 'teacher':
         return redirect('login')
@@ -349,10 +512,13 @@ def teacher_dashboard(request):
         messages.info(request, 'Please complete your profile before accessing the dashboard.')
         return redirect('edit_teacher_profile')
 
-    exams = Exam.objects.filter(created_by=request.user).annotate(
-        submission_count=Count('attempts', distinct=True),
-        question_count=Count('questions', distinct=True)
-    )
+    # counters are maintained by exam/signals.py, so this is a single read
+    exams = list(Exam.objects.filter(created_by=request.user).select_related('stats'))
+    for exam in exams:
+        stats = getattr(exam, 'stats', None)
+        exam.submission_count = stats.submission_count if stats else 0
+        exam.question_count = stats.question_count if stats else 0
+        exam.mean_score = stats.mean_score if stats else None
 
     total_submissions = sum(exam.submission_count for exam in exams)
     total_questions = sum(exam.question_count for exam in exams)
@@ -436,73 +602,195 @@ def delete_teacher_profile(request):
 
 #submission
 from django.db.models import Q
-from datetime import datetime
+from datetime import date, datetime, time
+from urllib.parse import urlencode
+from django.utils import timezone
 
 @login_required
+@analytics_reads
+@query_budget(7)
 def view_submissions(request, exam_id):
     if request.user.role != 'teacher':
         return redirect('login')
 
     exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
-    attempts = StudentExamAttempt.objects.filter(exam=exam)
+    attempts = StudentExamAttempt.objects.filter(exam=exam).select_related('student')
+
+    # every sort order has an (exam, field, id) index, see StudentExamAttempt.Meta
+    sort = request.GET.get('sort', '-submitted_at')
+    if sort not in SUBMISSION_SORTS:
+        sort = '-submitted_at'
 
     # Filtering
     score_min = request.GET.get('score_min')
     date_from = request.GET.get('date_from')
 
-    if score_min:
-        attempts = attempts.filter(score__gte=score_min)
-    if date_from:
-        attempts = attempts.filter(submitted_at__date__gte=date_from)
-
-
+    lookups = {}
+    try:
+        if score_min:
+            lookups['score__gte'] = float(score_min)
+        if date_from:
+            # a range on the column itself, so the (exam, submitted_at) index applies
+            lookups['submitted_at__gte'] = timezone.make_aware(datetime.combine(date.fromisoformat(date_from), time.min))
+    except ValueError:
+        messages.error(request, 'Invalid filter value.')
+        return redirect('view_submissions', exam_id=exam.id)
+    # the page is read in sort order from that sort's index, filters are checked on the way
+    attempts = filter_page(attempts, sort, **lookups)
+
+    cursor = request.GET.get('after')
+    attempts, next_cursor = keyset_page(attempts, sort, cursor, size=SUBMISSIONS_PAGE_SIZE)
+
+    filters = {key: value for key, value in (('score_min', score_min), ('date_from', date_from)) if value}
+    # column header links: first click uses the column's natural order, the next one flips it
+    sort_links = {}
+    for column, default in (('student_username', 'student_username'), ('score', '-score'), ('submitted_at', '-submitted_at')):
+        next_sort = default
+        if sort.lstrip('-') == column:
+            next_sort = column if sort.startswith('-') else f'-{column}'
+        sort_links[column] = '?' + urlencode({**filters, 'sort': next_sort})
+
+    stats = ExamStats.objects.filter(exam=exam).first()
     return render(request, 'teacher/view_submissions.html', {
         'exam': exam,
         'attempts': attempts,
         'score_min': score_min,
-        'date_from': date_from
+        'date_from': date_from,
+        'sort': sort,
+        'sort_links': sort_links,
+        'first_page_query': '?' + urlencode({**filters, 'sort': sort}),
+        'next_page_query': '?' + urlencode({**filters, 'sort': sort, 'after': next_cursor}) if next_cursor else None,
+        'is_first_page': not cursor,
+        'total_submissions': stats.submission_count if stats else None,
     })
 
 
 @login_required
-def view_student_answers(request, attempt_id):
-    attempt = get_object_or_404(StudentExamAttempt, id=attempt_id)
-    if request.user.role != 'teacher' or attempt.exam.created_by != request.user:
+def regrade_exam_view(request, exam_id):
+    if request.user.role != 'teacher':
         return redirect('login')
 
-    answers = attempt.answers.select_related('question')
-    return render(request, 'teacher/view_student_answers.html', {
-        'attempt': attempt,
-        'answers': answers
-    })
-
-
-
-
-
-
-
-
-
-
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    if request.method == 'POST':
+        report = regrade_exam(exam)
+        messages.success(request, f"Regraded {report['attempts']} submissions, {report['changed']} score(s) changed.")
+    return redirect('view_submissions', exam_id=exam.id)
 
 
+@login_required
+@query_budget(17)
+def item_analysis_view(request, exam_id):
+    if request.user.role != 'teacher':
+        return redirect('login')
 
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    # folds in attempts submitted since the last visit, usually none or a few
+    analysis = refresh_item_analysis(exam)
+    return render(request, 'teacher/item_analysis.html', {
+        'exam': exam,
+        'analysis': analysis,
+        'items': item_report(analysis),
+    })
 
 
+@login_required
+@analytics_reads
+@query_budget(6)
+def exam_leaderboard(request, exam_id):
+    if request.user.role != 'teacher':
+        return redirect('login')
 
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    try:
+        top = min(max(int(request.GET.get('top', LEADERBOARD_SIZE)), 1), 100)
+    except ValueError:
+        top = LEADERBOARD_SIZE
+
+    rank_index = get_rank_index(exam.id)
+    # served by the (exam, -score, id) index
+    attempts = list(
+        StudentExamAttempt.objects.filter(exam=exam).select_related('student').order_by('-score', 'id')[:top]
+    )
+    for attempt in attempts:
+        attempt.rank, attempt.percentile = rank_index.rank(attempt.score)
 
+    return render(request, 'teacher/leaderboard.html', {
+        'exam': exam,
+        'attempts': attempts,
+        'top': top,
+        'total': rank_index.total,
+        'cutoff': rank_index.kth_best_score(top),
+    })
 
 
+@login_required
+@analytics_reads
+def export_submissions(request, exam_id, kind, fmt):
+    if request.user.role != 'teacher':
+        return redirect('login')
 
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    rows = attempt_rows(exam) if kind == 'attempts' else answer_matrix_rows(exam)
+    filename = f"exam-{exam.id}-{kind}.{fmt}"
+    if fmt == 'csv':
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(
+            stream_xlsx(rows, kind.title()),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
+@login_required
+@analytics_reads
+@query_budget(7)
+def view_student_answers(request, attempt_id):
+    attempt = get_object_or_404(StudentExamAttempt, id=attempt_id)
+    if request.user.role != 'teacher' or attempt.exam.created_by != request.user:
+        return redirect('login')
 
+    answers = attempt.get_answers()
+    return render(request, 'teacher/view_student_answers.html', {
+        'attempt': attempt,
+        'answers': answers
+    })
 
 
+@admin_required
+def cache_stats(request):
+    # Counters are per app process
+    return JsonResponse({
+        'answer_keys': answer_key_cache.stats(),
+        'exam_papers': paper_cache.stats(),
+        'rank_indexes': rank_cache.stats(),
+    })
 
 
+@admin_required
+def admission_stats(request):
+    # Admitted / queued / rejected counts per exam for this app process
+    return JsonResponse({'exams': admission_controller.stats()})
 
 
+@admin_required
+def query_stats(request):
+    # Sampled query counts and timings per URL name for this app process
+    return JsonResponse({'aliases': metrics_store.alias_totals(), 'views': metrics_store.stats()})
 
 
+def static_asset(request, path):
+    # Serves collected static files (see exam/static_assets.py), picking a
+    # precompressed variant when the client accepts it
+    root = str(settings.STATIC_ROOT)
+    if path.endswith(('.gz', '.br')):
+        raise Http404
+    served, _ = pick_encoding(root, path, request.headers.get('Accept-Encoding', ''))
+    response = serve(request, served, document_root=root)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if getattr(staticfiles_storage, 'is_hashed', None) and staticfiles_storage.is_hashed(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=300)
+    return response
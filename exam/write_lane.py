@@ -0,0 +1,101 @@
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+
+def write_lane_enabled():
+    return getattr(settings, 'EXAM_WRITE_LANE', False)
+
+
+def write_lane_batch():
+    return getattr(settings, 'EXAM_WRITE_LANE_BATCH', 50)
+
+
+def write_lane_timeout():
+    return getattr(settings, 'EXAM_WRITE_LANE_TIMEOUT', 30.0)
+
+
+class WriteLane:
+    """
+    Per-process single writer.
+
+    Request threads hand their writes to one background thread, which takes
+    everything queued up (at most EXAM_WRITE_LANE_BATCH writes) and commits
+    it as one transaction with a savepoint per write. SQLite only allows
+    one writer at a time anyway; this way requests wait in a queue instead
+    of on the database lock, and a batch shares a single commit.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def run(self, func, *args):
+        # Run func(*args) in the lane and return its result (or raise its error)
+        future = Future()
+        self._queue.put((future, func, args))
+        self._start_thread()
+        try:
+            return future.result(timeout=write_lane_timeout())
+        except TimeoutError:
+            if future.cancel():
+                raise OperationalError('Timed out waiting for the write lane.')
+            # already being written, it will not take much longer
+            return future.result()
+
+    def _start_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='exam-write-lane', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < write_lane_batch():
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # skip writes whose request gave up waiting
+            batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+            try:
+                self.write(batch)
+            finally:
+                connections.close_all()
+
+    def write(self, batch):
+        results = []
+        try:
+            with transaction.atomic():
+                for future, func, args in batch:
+                    try:
+                        with transaction.atomic():
+                            results.append((future, func(*args), None))
+                    except OperationalError:
+                        # the database itself is failing (e.g. locked), the
+                        # rest of the batch would fail the same way
+                        raise
+                    except Exception as exc:
+                        # e.g. a replayed submission token (IntegrityError) or a
+                        # bad submission, only that write fails
+                        results.append((future, None, exc))
+        except Exception as exc:
+            for future, _, _ in batch:
+                future.set_exception(exc)
+            return
+        # only report back once the batch is committed
+        for future, result, exc in results:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+write_lane = WriteLane()
@@ -57,6 +57,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'exam.query_metrics.QueryMetricsMiddleware',
+    'exam.db_router.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'online_exam_portal.urls'
@@ -83,13 +85,41 @@ WSGI_APPLICATION = 'online_exam_portal.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+SQLITE_OPTIONS = {
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-20000;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # WAL lets readers run alongside the single writer, and writers wait
+        # up to `timeout` seconds for the lock instead of failing with
+        # "database is locked". BEGIN IMMEDIATE takes the write lock when a
+        # transaction starts rather than failing to upgrade a read lock later.
+        # synchronous=NORMAL is durable in WAL mode except on power loss.
+        'OPTIONS': SQLITE_OPTIONS,
+    },
+    # read replica for the teacher reports (see EXAM_ANALYTICS_DB below);
+    # with SQLite, `python manage.py sync_analytics_replica` refreshes it.
+    # The file is only created by that sync (never migrated, see
+    # AnalyticsRouter.allow_migrate); tests use an in-memory database.
+    'analytics': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_analytics.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+    },
 }
 
+DATABASE_ROUTERS = ['exam.db_router.AnalyticsRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -127,6 +157,19 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS=[STATIC_DIR]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# `python manage.py build_static` resizes / converts images, then collectstatic
+# writes content-hashed copies (styles.<hash>.css) with .gz (and .br when the
+# `brotli` package is installed) variants next to them.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'exam.static_assets.CompressedManifestStaticFilesStorage'},
+}
+
+# Serve STATIC_ROOT from the app itself (far-future caching for hashed names).
+# With DEBUG on, runserver serves the source files instead.
+EXAM_SERVE_STATIC = not DEBUG
 
 
 # Default primary key field type
@@ -147,3 +190,56 @@ MESSAGE_TAGS = {
     messages.INFO: 'info',
     messages.WARNING: 'warning',
 }
+
+
+# Exam grading
+# When True, submit_exam only queues the submission and
+# `python manage.py grade_submissions` grades it in the background.
+EXAM_QUEUED_GRADING = False
+
+# When True, an attempt's selections are stored packed on the attempt row
+# (4 bits per question) instead of one StudentAnswer row per question.
+EXAM_PACKED_ANSWERS = False
+
+# When True, graded attempts are written by one background thread per app
+# process, which commits everything queued up in one transaction (at most
+# EXAM_WRITE_LANE_BATCH attempts). Requests wait up to EXAM_WRITE_LANE_TIMEOUT
+# seconds. Compare with `python manage.py benchmark_submissions`.
+EXAM_WRITE_LANE = False
+EXAM_WRITE_LANE_BATCH = 50
+EXAM_WRITE_LANE_TIMEOUT = 30.0
+
+# Answer autosave: drafts are buffered per process and flushed in batches
+# every EXAM_DRAFT_FLUSH_INTERVAL seconds (0 writes each save straight through)
+EXAM_DRAFT_FLUSH_INTERVAL = 2.0
+EXAM_DRAFT_FLUSH_BATCH = 200
+
+# In-process caches (per app process), stats at /admin_cache_stats/
+EXAM_ANSWER_KEY_CACHE_BYTES = 8 * 1024 * 1024
+EXAM_PAPER_CACHE_BYTES = 16 * 1024 * 1024
+
+# Exams with more questions than this are delivered one section at a time
+EXAM_SECTION_SIZE = 25
+
+# Admission control for attempt_exam / submit_exam, per exam and app process.
+# Exams can override rate, burst and concurrency; stats at /admin_admission_stats/
+EXAM_ADMISSION_ENABLED = True
+EXAM_ADMISSION = {
+    'rate': 50.0,
+    'burst': 200,
+    'concurrency': 64,
+    'submit_reserve': 16,
+    'submit_wait': 10.0,
+}
+
+# Per view query count, DB time, template render time and slowest SQL for
+# this fraction of requests (0 turns it off, 1 measures every request).
+# Stats per app process at /admin_query_stats/
+EXAM_QUERY_METRICS_SAMPLE_RATE = 0.05
+
+# Alias the read-only teacher reports (submissions, answers, dashboard,
+# leaderboard, exports) read from; None reads everything from default.
+# After a POST a browser reads from default for EXAM_PRIMARY_PIN_SECONDS
+# so teachers see their own changes straight away.
+EXAM_ANALYTICS_DB = None
+EXAM_PRIMARY_PIN_SECONDS = 10
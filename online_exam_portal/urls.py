@@ -1,5 +1,7 @@
+import re
+
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from accounts import views as accounts_views
 from exam import views as exam_views
 from django.conf import settings
@@ -22,6 +24,9 @@ urlpatterns = [
     path('admin_users_add/', accounts_views.user_add, name='user_add'),
     path('admin_users/edit/<int:user_id>/', accounts_views.user_edit, name='user_edit'),
     path('admin_users/delete/<int:user_id>/', accounts_views.user_delete, name='user_delete'),
+    path('admin_cache_stats/', exam_views.cache_stats, name='cache_stats'),
+    path('admin_admission_stats/', exam_views.admission_stats, name='admission_stats'),
+    path('admin_query_stats/', exam_views.query_stats, name='query_stats'),
  
     # Exam CRUD (shared for Admin + Teacher)
     path('exams/', exam_views.exam_list, name='exam_list'),
@@ -32,6 +37,7 @@ urlpatterns = [
     # Question CRUD (shared for Admin + Teacher)
     path('exam_list_dashboard/', exam_views.exam_question_dashboard_view, name='exam_dashboard'),
     path('exams/<int:exam_id>/questions/', exam_views.question_list, name='question_list'),
+    path('exams/<int:exam_id>/questions/import/', exam_views.import_questions_view, name='import_questions'),
     path('exams/<int:exam_id>/questions/add/', exam_views.add_question, name='add_question'),
     path('questions/<int:question_id>/edit/', exam_views.edit_question, name='edit_question'),
     path('questions/<int:question_id>/delete/', exam_views.delete_question, name='delete_question'),
@@ -42,8 +48,11 @@ urlpatterns = [
     path('student_profile_edit/', exam_views.edit_student_profile, name='edit_student_profile'),
     path('student_exams/', exam_views.student_exam_list, name='student_exam_list'),
     path('student_exam/<int:exam_id>/attempt/', exam_views.attempt_exam, name='attempt_exam'),
+    path('student_exam/<int:exam_id>/section/<int:section>/', exam_views.exam_section, name='exam_section'),
     path('student_exam/<int:exam_id>/submit/', exam_views.submit_exam, name='submit_exam'),
+    path('student_exam/<int:exam_id>/draft/', exam_views.save_answer_draft, name='save_answer_draft'),
     path('student_exam_result/<int:attempt_id>/', exam_views.student_exam_result, name='student_exam_result'),
+    path('student_exam_submission/<int:submission_id>/', exam_views.submission_status, name='submission_status'),
     path('student_exam_history/', exam_views.student_exam_history, name='student_exam_history'),
     path('student_exam_attempt/delete/<int:attempt_id>/', exam_views.delete_student_exam_attempt, 
          name='delete_student_exam_attempt'),
@@ -59,8 +68,18 @@ urlpatterns = [
     # Teacher Exam Dashboard (Submissions & Answers only)
     path('teacher/exam_dashboard/', exam_views.teacher_exam_dashboard, name='teacher_exam_dashboard'),
     path('teacher/exam/<int:exam_id>/submissions/', exam_views.view_submissions, name='view_submissions'),
+    path('teacher/exam/<int:exam_id>/regrade/', exam_views.regrade_exam_view, name='regrade_exam'),
+    path('teacher/exam/<int:exam_id>/item_analysis/', exam_views.item_analysis_view, name='item_analysis'),
+    path('teacher/exam/<int:exam_id>/leaderboard/', exam_views.exam_leaderboard, name='exam_leaderboard'),
+    re_path(r'^teacher/exam/(?P<exam_id>\d+)/export/(?P<kind>attempts|answers)\.(?P<fmt>csv|xlsx)$',
+            exam_views.export_submissions, name='export_submissions'),
     path('teacher/answers/<int:attempt_id>/', exam_views.view_student_answers, name='view_student_answers'),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if getattr(settings, 'EXAM_SERVE_STATIC', False):
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), exam_views.static_asset),
+    ]